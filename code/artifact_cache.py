@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from multiprocessing import Pool
+import temporal_sampler
+import video_decode
+from temporal_sampler import TemporalSampler
+from video_decode import open_video, decode_plan
+from label_table import LabelTable
+from atomic_file import atomic_write, atomic_json
+
+# derived clips stored under a key made of (hash of the source video, preprocessing params,
+# hash of the code that made them):
+#   <root>/objects/ab/abcdef.../      the files of one artifact
+#   <root>/index.json                 key -> source, params, code version, outputs, bytes, last used
+#   <root>/source_hashes.json         path -> size, mtime, content hash (videos are hashed once)
+# materialize() fills a normal <id>.npy folder for the datasets with hardlinks into objects/,
+# and convert_engine.run_conversion(cache=...) does the same for the converters' output folders,
+# so every experiment that asks for the same params shares the same files and a changed
+# resize or frame count only builds what it has never seen. gc() drops the least recently
+# used artifacts until the store fits its disk budget
+
+HASH_CHUNK = 8 * 1024 * 1024
+
+
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_version(*modules):
+    # changes whenever the source of any module that shapes the output changes
+    digest = hashlib.blake2b(digest_size=8)
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def artifact_key(source_hash, params, version):
+    blob = json.dumps([source_hash, params, version], sort_keys=True).encode()
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+
+def load_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def link_file(path, link_path):
+    # hardlink, or a copy across filesystems
+    if os.path.exists(link_path):
+        if os.path.samefile(path, link_path):
+            return
+        os.remove(link_path)
+    try:
+        os.link(path, link_path)
+    except OSError:
+        shutil.copyfile(path, link_path)
+
+
+def decode_clip(video_path, params):
+    # the default build: num_frames frames picked by `sampling`, resized to height x width
+    cap, length = open_video(video_path)
+    if cap is None:
+        raise ValueError(f"cannot open {video_path}")
+    try:
+        indices = TemporalSampler(params["num_frames"], params.get("sampling", "head")).base_indices(length)[0]
+        clip, _ = decode_plan(cap, indices, (params["width"], params["height"]))
+    finally:
+        cap.release()
+    return clip
+
+
+CLIP_NAME = "clip.npy"
+
+
+def build_job(job):
+    build, source_path, params, key, out_dir = job
+    try:
+        clip = build(source_path, params)
+        os.makedirs(out_dir, exist_ok=True)
+        atomic_write(os.path.join(out_dir, CLIP_NAME), lambda f: np.save(f, clip))
+    except Exception as e:
+        return key, f"{type(e).__name__}: {e}"
+    return key, None
+
+
+class ArtifactCache:
+    def __init__(self, root, budget_bytes=None):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_path = os.path.join(root, "index.json")
+        self.hashes_path = os.path.join(root, "source_hashes.json")
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.index = load_json(self.index_path)
+        self.hashes = load_json(self.hashes_path)
+
+    def object_dir(self, key):
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def source_hash(self, path):
+        stat = os.stat(path)
+        path = os.path.abspath(path)
+        entry = self.hashes.get(path)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            entry = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": file_hash(path)}
+            self.hashes[path] = entry
+        return entry["hash"]
+
+    def save(self):
+        atomic_json(self.index_path, self.index)
+        atomic_json(self.hashes_path, self.hashes)
+
+    def output_paths(self, key):
+        return [os.path.join(self.object_dir(key), name) for name in self.index[key]["outputs"]]
+
+    def lookup(self, key):
+        # the artifact's file paths, or None if it was never built or lost a file
+        if key not in self.index:
+            return None
+        paths = self.output_paths(key)
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        self.index[key]["last_used"] = time.time()
+        return paths
+
+    def add(self, key, source, params, version, outputs, **info):
+        # records an artifact whose files (outputs, names inside object_dir(key)) are written
+        paths = [os.path.join(self.object_dir(key), name) for name in outputs]
+        self.index[key] = dict(info, source=os.path.abspath(source), params=params, code_version=version,
+                               outputs=list(outputs), bytes=sum(os.path.getsize(path) for path in paths),
+                               last_used=time.time())
+        return paths
+
+    def build_all(self, sources, params, version, build=decode_clip, processes=None):
+        # sources: {name: source path}. returns {name: artifact path} for everything that built
+        keys = {name: artifact_key(self.source_hash(path), params, version) for name, path in sources.items()}
+
+        # identical sources share one artifact, so names are grouped by key
+        names_of = {}
+        for name, key in keys.items():
+            names_of.setdefault(key, []).append(name)
+
+        paths = {}
+        jobs = []
+        for key, names in names_of.items():
+            found = self.lookup(key)
+            if found is not None:
+                paths.update({name: found[0] for name in names})
+                continue
+            jobs.append((build, sources[names[0]], params, key, self.object_dir(key)))
+
+        print(f"artifacts for {params} @ {version}: {len(names_of) - len(jobs)} reused, {len(jobs)} to build")
+
+        failed = 0
+        if jobs:
+            with Pool(processes) as pool:
+                for key, error in pool.imap_unordered(build_job, jobs):
+                    if error is not None:
+                        failed += 1
+                        print(f"failed {names_of[key]}: {error}")
+                        continue
+
+                    out_path = self.add(key, sources[names_of[key][0]], params, version, [CLIP_NAME])[0]
+                    paths.update({name: out_path for name in names_of[key]})
+
+        if failed:
+            print(f"{failed} artifacts failed to build")
+
+        self.save()
+        if self.budget_bytes is not None:
+            self.gc(self.budget_bytes, keep=set(keys.values()))
+        return paths
+
+    def materialize(self, video_dir, video_ids, params, out_dir, version=None, build=decode_clip, processes=None):
+        # <out_dir>/<id>.npy for the datasets (dataloader_npy / dataloader_pipe), linked into objects/
+        if version is None:
+            version = code_version(sys.modules[build.__module__], temporal_sampler, video_decode)
+
+        sources = {video_id: os.path.join(video_dir, f"{video_id}.mp4") for video_id in video_ids}
+        sources = {video_id: path for video_id, path in sources.items() if os.path.exists(path)}
+        paths = self.build_all(sources, params, version, build, processes)
+
+        os.makedirs(out_dir, exist_ok=True)
+        for video_id, path in paths.items():
+            link_file(path, os.path.join(out_dir, f"{video_id}.npy"))
+
+        print(f"{out_dir}: {len(paths)} of {len(video_ids)} clips")
+
+    def gc(self, budget_bytes, keep=()):
+        # forget artifacts whose file is gone, then evict least recently used ones over budget.
+        # a file still linked into a dataset folder only frees its space once that folder goes too
+        self.index = {key: entry for key, entry in self.index.items() if os.path.isdir(self.object_dir(key))}
+
+        total = sum(entry["bytes"] for entry in self.index.values())
+        removed, freed = 0, 0
+        for key in sorted(self.index, key=lambda key: self.index[key]["last_used"]):
+            if total <= budget_bytes:
+                break
+            if key in keep:
+                continue
+            shutil.rmtree(self.object_dir(key), ignore_errors=True)
+            total -= self.index[key]["bytes"]
+            freed += self.index[key]["bytes"]
+            removed += 1
+            del self.index[key]
+
+        self.save()
+        print(f"artifact cache {self.root}: {len(self.index)} artifacts, {total / 2**30:.2f} GiB, "
+              f"removed {removed} ({freed / 2**30:.2f} GiB)")
+
+
+def main():
+    all_vids = "../../dissData/allVids"
+    cache = ArtifactCache("../../dissData/artifacts", budget_bytes=200 * 1024 ** 3)
+    video_ids = LabelTable().ids.tolist()
+
+    cache.materialize(all_vids, video_ids, {"num_frames": 32, "height": 128, "width": 128},
+                      "../../dissData/video_npy_reduced/allVids_32x128")
+    cache.materialize(all_vids, video_ids, {"num_frames": 32, "height": 112, "width": 112, "sampling": "uniform"},
+                      "../../dissData/video_npy_reduced/allVids_32x112_uniform")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+import json
+
+# tables, indexes and caches that other runs read are written to <path>.tmp first and only moved
+# over <path> once complete, so a crash or ctrl-c mid write never leaves a half written file
+
+
+def atomic_write(path, write, mode='wb'):
+    # write(f) fills the temp file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def atomic_json(path, data, indent=None):
+    atomic_write(path, lambda f: json.dump(data, f, indent=indent), mode='w')
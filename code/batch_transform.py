@@ -0,0 +1,30 @@
+import torch
+
+# datasets hand back uint8 clips shaped (N, T, H, W, C); the models want float (N, C, T, H, W).
+# the cast, scaling, mean/std normalisation and the layout change are done here in one
+# pass on the training device, so workers only ever move uint8 around.
+# with memory_format=torch.channels_last_3d the output is NDHWC in memory, which is the order
+# the uint8 clips already come in, so the layout change becomes a straight copy
+
+
+class BatchTransform:
+    def __init__(self, device, scale=1.0 / 255.0, mean=None, std=None, memory_format=torch.contiguous_format):
+        self.device = device
+        self.memory_format = memory_format
+
+        # x' = (x * scale - mean) / std folded into one multiply and one subtract per channel
+        mean = torch.zeros(3) if mean is None else torch.tensor(mean, dtype=torch.float32)
+        std = torch.ones(3) if std is None else torch.tensor(std, dtype=torch.float32)
+
+        self.mul = (scale / std).view(1, -1, 1, 1, 1).to(device)
+        self.sub = (mean / std).view(1, -1, 1, 1, 1).to(device)
+
+    def __call__(self, frames):
+        frames = frames.to(self.device, non_blocking=True)
+
+        n, t, h, w, c = frames.shape
+        out = torch.empty((n, c, t, h, w), dtype=torch.float32, device=self.device, memory_format=self.memory_format)
+        out.copy_(frames.permute(0, 4, 1, 2, 3))
+        out.mul_(self.mul).sub_(self.sub)
+
+        return out
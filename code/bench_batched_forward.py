@@ -0,0 +1,241 @@
+import time
+import torch
+import models
+import models_32_frame_128
+import pipe_models
+
+# the end to end models used to run their conv stack once per clip (for frame in x, on an
+# unbatched (C, T, H, W) slice) and stack the features. they now take the whole batch at once.
+# the looped forwards below are copies of what the models did before; this checks the batched
+# forward against them in train and in eval mode (batch norm state restored between the two
+# runs) and times both.
+# models.py's C3DExtended (trainer.py, c3d_classifier.py) cannot run: its last BatchNorm2d
+# expects 4 frames where only 2 are left, with or without batching. its frame_norm is checked
+# against the per clip norm on its own instead
+
+BATCH_SIZE = 8
+REPEATS = 3
+TOLERANCE = 1e-4
+
+
+def looped_features(cnn, x):
+    features = []
+    for frame in x:
+        feature_out = cnn(frame)
+        features.append(feature_out)
+
+    features = torch.stack(features, dim=0)
+    return features.flatten(start_dim=1, end_dim=2)
+
+
+def looped_end_to_end(self, x):
+    classification_output = self.classifier(x)
+
+    features = looped_features(self.cnn, x)
+
+    fc_out = self.fully_connected(features)
+    final_score = self.final_score_regressor(fc_out)
+
+    return {
+        'classification': classification_output,
+        'final_score': final_score
+    }
+
+
+def looped_ete_c3d(self, x):
+    features = looped_features(self.cnn_layer, x)
+    fc_out = self.fully_connected(features)
+
+    classification_output = self.classifier(fc_out)
+    final_score = self.scorer(fc_out)
+
+    return {
+        'classification': classification_output,
+        'final_score': final_score
+    }
+
+
+def looped_ete_model_final(self, x):
+    features = []
+    for frame in x:
+        feature_out = self.relu(self.pre_conv(frame))
+        c = self.pre_pool(feature_out)
+
+        c = self.relu(self.conv1(c))
+        c = self.pool1(c)
+
+        c = self.relu(self.conv2(c))
+        c = self.pool2(c)
+
+        c = self.relu(self.conv3a(c))
+        c = self.relu(self.conv3b(c))
+        c = self.pool3(c)
+
+        c = self.relu(self.conv4a(c))
+        c = self.relu(self.conv4b(c))
+        c = self.pool4(c)
+
+        c = self.relu(self.conv5a(c))
+        c = self.relu(self.conv5b(c))
+        c = self.pool5(c)
+
+        c = c.reshape(c.size(0), -1)
+        features.append(c)
+
+    features = torch.stack(features, dim=0)
+    features = features.flatten(start_dim=1, end_dim=2)
+
+    features = self.fc1(features)
+    c = self.fc_class(features)
+    s = self.fc_scorer(features)
+
+    return {"classification": c, "final_score": s}
+
+
+def looped_c3d_aqa(self, x):
+    features = []
+
+    for frame in x:
+        h = self.relu(self.conv1(frame))
+        h = self.pool1(h)
+
+        h = self.relu(self.conv2(h))
+        h = self.pool2(h)
+
+        h = self.relu(self.conv3a(h))
+        h = self.relu(self.conv3b(h))
+        h = self.pool3(h)
+
+        h = self.relu(self.conv4a(h))
+        h = self.relu(self.conv4b(h))
+        h = self.pool4(h)
+
+        h = self.relu(self.conv5a(h))
+        h = self.relu(self.conv5b(h))
+        h = self.pool5(h)
+
+        h = h.reshape(h.size(0), -1)
+
+        features.append(h)
+
+    features = torch.stack(features, dim=0)
+    features = features.flatten(start_dim=1, end_dim=2)
+
+    h = self.relu(self.fc1(features))
+    h = self.relu(self.fc2(h))
+    h = self.relu(self.fc3(h))
+
+    return h
+
+
+def model_cases():
+    return [
+        ("models.ETEModelFinal", models.ETEModelFinal, looped_ete_model_final, (3, 16, 256, 256)),
+        ("models_32_frame_128.EndToEndModel", lambda: models_32_frame_128.EndToEndModel(
+            models_32_frame_128.ClassifierCNN3D(t_dim=32, img_x=128, img_y=128), models_32_frame_128.C3DExtended(),
+            models_32_frame_128.FullyConnected(), models_32_frame_128.ScoreRegressor()),
+         looped_end_to_end, (3, 32, 128, 128)),
+        ("models_32_frame_128.ETEC3D", lambda: models_32_frame_128.ETEC3D(
+            models_32_frame_128.ClassifierETE(), models_32_frame_128.C3DExtended(),
+            models_32_frame_128.FullyConnected(), models_32_frame_128.ScoreRegressor()),
+         looped_ete_c3d, (3, 32, 128, 128)),
+        ("pipe_models.C3DAQA", pipe_models.C3DAQA, looped_c3d_aqa, (3, 32, 128, 128)),
+    ]
+
+
+def outputs(out):
+    return out if isinstance(out, dict) else {"out": out}
+
+
+def max_diff(batched, looped):
+    diff = max((batched[key] - looped[key]).abs().max().item() for key in batched)
+    scale = max(looped[key].abs().max().item() for key in looped)
+    return diff, diff <= TOLERANCE * max(scale, 1.0)
+
+
+def compare(model, looped_forward, x):
+    # both forwards from the same weights and batch norm state; dropout draws the same masks
+    buffers = {name: buffer.clone() for name, buffer in model.named_buffers()}
+
+    torch.manual_seed(1)
+    batched = outputs(model(x))
+    batched_buffers = {name: buffer.clone() for name, buffer in model.named_buffers()}
+
+    for name, buffer in model.named_buffers():
+        buffer.copy_(buffers[name])
+    torch.manual_seed(1)
+    looped = outputs(looped_forward(model, x))
+
+    diff, ok = max_diff(batched, looped)
+    # running stats must move the same way too
+    for name, buffer in model.named_buffers():
+        ok &= torch.allclose(batched_buffers[name].float(), buffer.float(), atol=TOLERANCE)
+    return diff, ok
+
+
+def check_frame_norm():
+    # models.C3DExtended.frame_norm against normalising one unbatched clip at a time
+    torch.manual_seed(0)
+    cnn = models.C3DExtended()
+    x = torch.rand(BATCH_SIZE, 3, 16, 32, 32)
+
+    looped_cnn = models.C3DExtended()
+    looped_cnn.load_state_dict(cnn.state_dict())
+
+    failed = False
+    for mode in ("train", "eval"):
+        cnn.train(mode == "train")
+        looped_cnn.train(mode == "train")
+        with torch.no_grad():
+            batched = cnn.frame_norm(cnn.batch_norm1, x)
+            looped = torch.stack([looped_cnn.batch_norm1(clip) for clip in x])
+
+        diff = (batched - looped).abs().max().item()
+        ok = diff <= TOLERANCE and all(torch.allclose(a.float(), b.float(), atol=TOLERANCE) for a, b in
+                                       zip(cnn.batch_norm1.buffers(), looped_cnn.batch_norm1.buffers()))
+        failed |= not ok
+        print(f"{'models.C3DExtended.frame_norm':36s} {mode:5s} max diff {diff:.2e} {'ok' if ok else 'MISMATCH'}")
+    return failed
+
+
+def timed(fn, device):
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / REPEATS
+
+
+def main():
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    torch.manual_seed(0)
+
+    failed = check_frame_norm()
+    for name, build, looped_forward, clip_shape in model_cases():
+        model = build().to(device)
+        x = torch.rand((BATCH_SIZE,) + clip_shape, device=device)
+
+        with torch.no_grad():
+            diffs = {}
+            for mode in ("train", "eval"):
+                model.train(mode == "train")
+                diffs[mode] = compare(model, looped_forward, x)
+                failed |= not diffs[mode][1]
+
+            model(x)
+            batched_time = timed(lambda: model(x), device)
+            looped_time = timed(lambda: looped_forward(model, x), device)
+
+        checks = "  ".join(f"{mode} {diff:.2e} {'ok' if ok else 'MISMATCH'}" for mode, (diff, ok) in diffs.items())
+        print(f"{name:36s} {checks}  "
+              f"looped {looped_time * 1000:8.1f} ms  batched {batched_time * 1000:8.1f} ms  "
+              f"x{looped_time / batched_time:.2f}")
+
+    if failed:
+        raise SystemExit("batched forward does not match the looped forward")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import time
+import shutil
+import tempfile
+import numpy as np
+from clip_store import ClipStore, ClipStoreWriter, load_clip_file
+from clip_codec import CODECS, check_codec
+
+# disk vs CPU for the clip formats: packs the same clips with every codec that is installed
+# and times reading a whole clip and a 16 frame sample against np.load on the .npy files.
+# the files are read once before timing, so these are page cache (warm) numbers; on a cold
+# disk the raw formats pay for their extra bytes on top
+
+SRC_DIR = "../../dissData/video_npy_reduced/allVids"
+NUM_CLIPS = 64
+SAMPLE_FRAMES = 16
+
+
+def available_codecs():
+    codecs = []
+    for codec in CODECS:
+        try:
+            check_codec(codec)
+        except ImportError as e:
+            print(f"skipping {codec}: {e}")
+            continue
+        codecs.append(codec)
+    return codecs
+
+
+def time_reads(read, clip_ids):
+    read(clip_ids[0])
+    start = time.time()
+    for clip_id in clip_ids:
+        read(clip_id)
+    return (time.time() - start) / len(clip_ids)
+
+
+def sample_indices(num_frames):
+    return np.linspace(0, num_frames - 1, SAMPLE_FRAMES).astype(np.int64)
+
+
+def bench(src_dir=SRC_DIR, num_clips=NUM_CLIPS):
+    files = sorted(file for file in os.listdir(src_dir) if file.endswith(".npy"))[:num_clips]
+    paths = {os.path.splitext(file)[0]: os.path.join(src_dir, file) for file in files}
+    clip_ids = list(paths.keys())
+
+    npy_bytes = sum(os.path.getsize(path) for path in paths.values())
+    clips = {clip_id: load_clip_file(path) for clip_id, path in paths.items()}
+    print(f"{len(clip_ids)} clips of {clips[clip_ids[0]].shape}, {npy_bytes / len(clip_ids) / 2**20:.2f} MiB each as .npy")
+
+    full = time_reads(lambda clip_id: np.load(paths[clip_id]), clip_ids)
+    sample = time_reads(lambda clip_id: np.load(paths[clip_id], mmap_mode='r')[sample_indices(len(clips[clip_id]))], clip_ids)
+    print(f"{'format':>8} {'MiB/clip':>9} {'ratio':>6} {'encode ms':>10} {'clip ms':>8} {'sample ms':>10} {'max err':>8}")
+    print(f"{'np.load':>8} {npy_bytes / len(clip_ids) / 2**20:9.2f} {1.0:6.2f} {'-':>10} {full * 1000:8.2f} {sample * 1000:10.2f} {0:8d}")
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for codec in available_codecs():
+            out_path = os.path.join(tmp_dir, codec)
+
+            start = time.time()
+            with ClipStoreWriter(out_path, codec) as writer:
+                for clip_id in clip_ids:
+                    writer.add(clip_id, clips[clip_id])
+            encode = (time.time() - start) / len(clip_ids)
+
+            store = ClipStore(out_path)
+            store_bytes = os.path.getsize(out_path + ".bin")
+
+            full = time_reads(lambda clip_id: np.array(store.get(clip_id)), clip_ids)
+            sample = time_reads(lambda clip_id: store.read(clip_id, sample_indices(store.num_frames(clip_id))), clip_ids)
+            error = max(int(np.abs(store.get(clip_id).astype(np.int16) - clips[clip_id]).max()) for clip_id in clip_ids)
+
+            print(f"{codec:>8} {store_bytes / len(clip_ids) / 2**20:9.2f} {npy_bytes / store_bytes:6.2f} "
+                  f"{encode * 1000:10.2f} {full * 1000:8.2f} {sample * 1000:10.2f} {error:8d}")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main():
+    bench()
+
+if __name__ == "__main__":
+    main()
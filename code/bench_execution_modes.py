@@ -0,0 +1,88 @@
+import gc
+import os
+import sys
+import time
+import torch
+import torch._dynamo
+import models_32_frame_128
+import pipe_models
+import execution_mode
+from batch_transform import BatchTransform
+
+# training step time (forward, backward, AdamW step) of each 3D CNN in every EXECUTION_MODE on
+# the CPU, at the clip shapes the trainers feed them. the first step of a mode is reported on
+# its own since that is where torch.compile does its work (much less on a warm COMPILE_CACHE).
+# models.py's C3DExtended cannot run (see bench_batched_forward.py), so the C3DExtended row is
+# the models_32_frame_128 one
+
+BATCH_SIZE = 2
+STEPS = 3
+
+
+def model_cases():
+    return [
+        ("C3DExtended", models_32_frame_128.C3DExtended, (32, 128, 128)),
+        ("C3DExtended10Layers", models_32_frame_128.C3DExtended10Layers, (32, 128, 128)),
+        ("C3DAQA", pipe_models.C3DAQA, (32, 128, 128)),
+        ("ClassifierCNN3D", models_32_frame_128.ClassifierCNN3D, (16, 256, 256)),
+        ("BinaryClassifier", pipe_models.BinaryClassifier, (32, 128, 128)),
+        ("AQAResNet18", pipe_models.AQAResNet18, (32, 128, 128)),
+    ]
+
+
+def train_step(model, optimizer, frames):
+    optimizer.zero_grad()
+    loss = model(frames).float().pow(2).mean()
+    loss.backward()
+    optimizer.step()
+
+
+def time_mode(build, shape, mode):
+    torch.manual_seed(0)
+    model = execution_mode.prepare_model(build(), mode)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4)
+
+    to_input = BatchTransform(torch.device("cpu"), memory_format=execution_mode.memory_format(mode))
+    clips = torch.randint(0, 256, (BATCH_SIZE,) + shape + (3,), dtype=torch.uint8)
+    frames = to_input(clips)
+
+    start = time.perf_counter()
+    train_step(model, optimizer, frames)
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        train_step(model, optimizer, frames)
+    step = (time.perf_counter() - start) / STEPS
+
+    # C3DAQA's fully connected layers and their AdamW state are ~3 GB, so drop this mode's
+    # model and compiled graphs before the next one is built
+    del model, optimizer
+    torch._dynamo.reset()
+    gc.collect()
+    return first, step
+
+
+def main():
+    # python bench_execution_modes.py [model name ...] to time only some of them
+    wanted = set(sys.argv[1:])
+    print(f"{torch.__version__}, {torch.get_num_threads()} threads, batch {BATCH_SIZE}, "
+          f"compile cache {os.environ.get('TORCHINDUCTOR_CACHE_DIR', execution_mode.COMPILE_CACHE)}")
+
+    for name, build, shape in model_cases():
+        if wanted and name not in wanted:
+            continue
+        eager_step = None
+        for mode in execution_mode.MODES:
+            try:
+                first, step = time_mode(build, shape, mode)
+            except Exception as e:
+                print(f"{name:20s} {mode:14s} failed: {e}")
+                continue
+
+            eager_step = eager_step or (step if mode == "eager" else None)
+            speedup = f"x{eager_step / step:.2f}" if eager_step else ""
+            print(f"{name:20s} {mode:14s} first step {first:8.2f} s  step {step:8.3f} s  {speedup}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import sys
+import time
+import resource
+import multiprocessing
+import torch
+import execution_mode
+from batch_transform import BatchTransform
+from bench_execution_modes import model_cases
+
+# float32 against bfloat16 autocast for one training step (forward, backward, AdamW) of each
+# 3D CNN at its training clip shape, with the losses in float32 as in the trainers.
+# every (model, precision) runs in its own process so the peak memory (max RSS on the CPU,
+# max allocated on a GPU) belongs to that run alone
+
+BATCH_SIZE = 2
+STEPS = 3
+
+
+def run_case(name, precision, queue):
+    torch.manual_seed(0)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    build, shape = {case[0]: case[1:] for case in model_cases()}[name]
+
+    model = build().to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4)
+    criterion = torch.nn.MSELoss()
+    frames = BatchTransform(device)(torch.randint(0, 256, (BATCH_SIZE,) + shape + (3,), dtype=torch.uint8))
+
+    def step():
+        optimizer.zero_grad()
+        with execution_mode.autocast(device, precision):
+            output = model(frames)
+        output = execution_mode.float_outputs(output)
+        loss = criterion(output, torch.zeros_like(output))
+        loss.backward()
+        optimizer.step()
+
+    step()
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        step()
+    step_time = (time.perf_counter() - start) / STEPS
+
+    if device.type == "cuda":
+        peak = torch.cuda.max_memory_allocated() / 1024 ** 2
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((step_time, peak))
+
+
+def measure(name, precision):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run_case, args=(name, precision, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return None
+    return queue.get()
+
+
+def main():
+    # python bench_mixed_precision.py [model name ...] to time only some of them
+    wanted = set(sys.argv[1:])
+    print(f"{torch.__version__}, {torch.get_num_threads()} threads, batch {BATCH_SIZE}")
+
+    for name, _, shape in model_cases():
+        if wanted and name not in wanted:
+            continue
+
+        results = {precision: measure(name, precision) for precision in execution_mode.PRECISIONS}
+        if None in results.values():
+            print(f"{name:20s} failed ({', '.join(p for p, r in results.items() if r is None)})")
+            continue
+
+        (fp32_step, fp32_peak), (bf16_step, bf16_peak) = results["fp32"], results["bf16"]
+        print(f"{name:20s} fp32 {fp32_step:7.3f} s {fp32_peak:8.0f} MB   bf16 {bf16_step:7.3f} s {bf16_peak:8.0f} MB   "
+              f"step x{fp32_step / bf16_step:.2f}  memory {100 * (bf16_peak - fp32_peak) / fp32_peak:+.0f}%")
+
+if __name__ == "__main__":
+    main()
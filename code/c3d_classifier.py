@@ -2,10 +2,13 @@ import time
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
 from torch.utils.tensorboard import SummaryWriter
 from models import C3DExtended, FullyConnected, ScoreRegressor, ClassifierETE, ETEC3D
 from dataloader_aug import VideoDataset
+from batch_transform import BatchTransform
+from loader_factory import make_loader
+from prefetcher import BatchPrefetcher
+from execution_mode import memory_format, prepare_model, autocast, float_outputs
 import numpy as np
 from scipy.stats import spearmanr
 from sklearn.metrics import roc_auc_score
@@ -22,12 +25,13 @@ def evaluate_scorer(classifier_, cnn_, fully_connected_, scorer_, ete, data_load
     true_scores = []
     with torch.no_grad():
         for batch_data in data_loader:
-            frames = batch_data[0].type(torch.FloatTensor).to(device)
-            frames = frames.permute(0, 4, 1, 2, 3)
-            score_labels = batch_data[2].type(torch.FloatTensor).to(device)
+            frames = batch_data[0]
+            score_labels = batch_data[2]
 
 
-            output = eteModel(frames)
+            with autocast(device):
+                output = eteModel(frames)
+            output = float_outputs(output)
             out_score = output['final_score']
 
             predicted_scores.extend(out_score.cpu().numpy())
@@ -58,11 +62,12 @@ def get_accuracy_classification(ete, cnn, classifier, scorer, fully_connected, t
 
     with torch.no_grad():
         for data in test_data:
-            frames = data[0].type(torch.FloatTensor).to(device)
-            frames = frames.permute(0, 4, 1, 2, 3)
-            classification_labels = data[1].type(torch.FloatTensor).to(device)
+            frames = data[0]
+            classification_labels = data[1]
 
-            outputs = ete(frames)
+            with autocast(device):
+                outputs = ete(frames)
+            outputs = float_outputs(outputs)
 
             _, pred = torch.max(outputs['classification'], 1)
             total += classification_labels.size(0)
@@ -121,6 +126,8 @@ if torch.cuda.is_available():
 else:
     device = torch.device("cpu")
 
+to_input = BatchTransform(device, memory_format=memory_format())
+
 step = 0
 log_frequency = 5
 running_loss_print_freq = 50
@@ -141,9 +148,9 @@ labels_test = "../../labels/test_labels/test.pkl"
 test_vids = "../../../dissData/video_npy/test"
 video_dataset_test = VideoDataset(test_vids, labels_test, transform=None, num_frames=16)
 
-train_data_loader = DataLoader(video_dataset, batch_size=batch_size, shuffle=True)
-validation_data = DataLoader(video_dataset_valid, batch_size)
-test_data_loader = DataLoader(video_dataset_test, batch_size)
+train_data_loader = BatchPrefetcher(make_loader(video_dataset, batch_size, shuffle=True), to_input)
+validation_data = BatchPrefetcher(make_loader(video_dataset_valid, batch_size), to_input)
+test_data_loader = BatchPrefetcher(make_loader(video_dataset_test, batch_size), to_input)
 
 
 pre_trained_c3d_dict = torch.load(c3d_pkl_path) #load c3d weights
@@ -165,6 +172,7 @@ score_reg = score_reg.to(device)
 cnnLayer = cnnLayer.to(device)
 classifier = classifier.to(device)
 eteModel = eteModel.to(device)
+eteModel = prepare_model(eteModel)
 
 
 criterion_classification = nn.BCELoss()
@@ -181,7 +189,6 @@ num_epochs = 50
 for epoch in range(num_epochs):
     epoch_start_time = time.time()
     print('-------------------------------------------------------------------------------------------------------')
-    data_load_start_time = time.time()
     classification_running_loss = 0.0
     scorer_running_loss = 0.0
     score_reg.train()
@@ -191,17 +198,18 @@ for epoch in range(num_epochs):
     eteModel.train()
 
     for _, batch_data in enumerate(train_data_loader):
-        frames = batch_data[0].type(torch.FloatTensor).to(device)
-        frames = frames.permute(0, 4, 1, 2, 3)
-        classification_labels = batch_data[1].type(torch.FloatTensor).to(device)
-        score_labels = batch_data[2].type(torch.FloatTensor).to(device)
+        frames = batch_data[0]
+        classification_labels = batch_data[1]
+        score_labels = batch_data[2]
         score_labels = score_labels.float().view(-1, 1)
 
         data_load_end_time = time.time()
 
         optimizer.zero_grad()
 
-        output = eteModel(frames)
+        with autocast(device):
+            output = eteModel(frames)
+        output = float_outputs(output)
 
         classification_output = output['classification']
         final_score_output = output['final_score']
@@ -224,7 +232,7 @@ for epoch in range(num_epochs):
         classification_running_loss += classification_loss.item()
         scorer_running_loss += final_score_loss.item()
 
-        data_load_time = data_load_end_time - data_load_start_time
+        data_load_time = train_data_loader.last_stall
         step_time = time.time() - data_load_end_time
 
         if ((step + 1) % log_frequency) == 0:
@@ -248,6 +256,7 @@ for epoch in range(num_epochs):
         print_metrics(epoch=epoch+1, loss=avg_classification_loss, accuracy=accuracy_class, type="classification ", epoch_end=epoch_time, auc=auc)
         print_metrics(epoch=epoch+1, loss=avg_scorer_loss, accuracy=correlation_coeff, type="scorer spearmanr correlation ", epoch_end=epoch_time)
         print(f"running losses: {classification_running_loss, scorer_running_loss} [class, scorer]")
+        print(f"input stall: {train_data_loader.stall_time:.3f}s of {epoch_time:.3f}s epoch")
 
     if (epoch + 1) % 5 == 0:
         torch.save(eteModel.state_dict(), 'ETE_model_C3D_class.pth')
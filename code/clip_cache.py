@@ -0,0 +1,107 @@
+import multiprocessing as mp
+import numpy as np
+import torch
+
+# decoded clips kept in RAM across epochs, shared by every DataLoader worker.
+# the budget is cut into fixed size slots (one clip each) living in shared memory together
+# with the bookkeeping arrays, so a clip loaded by one worker is a hit for all the others.
+# when the cache is full the least recently used slot is reused.
+# it has to be created in the main process, before the DataLoader starts its workers.
+
+CLOCK, HITS, MISSES, EVICTIONS = range(4)
+
+
+class ClipCache:
+    def __init__(self, budget_bytes, slot_bytes, keys, context=None):
+        self.budget_bytes = budget_bytes
+        self.slot_bytes = max(int(slot_bytes), 1)
+        self.key_index = {key: i for i, key in enumerate(keys)}
+
+        # never more slots than there are clips to hold, the arena is allocated up front
+        self.num_slots = int(min(budget_bytes // self.slot_bytes, len(self.key_index)))
+
+        self.arena = torch.empty(self.num_slots * self.slot_bytes, dtype=torch.uint8).share_memory_()
+        self.slot_of = torch.full((len(self.key_index),), -1, dtype=torch.int64).share_memory_()
+        self.owner = torch.full((self.num_slots,), -1, dtype=torch.int64).share_memory_()
+        self.last_used = torch.zeros(self.num_slots, dtype=torch.int64).share_memory_()
+        self.shapes = torch.zeros((self.num_slots, 4), dtype=torch.int64).share_memory_()
+        self.counters = torch.zeros(4, dtype=torch.int64).share_memory_()
+
+        # must come from the same multiprocessing context as the DataLoader workers
+        self.lock = mp.get_context(context).Lock()
+        self.views = None
+
+    def __getstate__(self):
+        # numpy views are rebuilt on the worker side over the same shared memory
+        state = self.__dict__.copy()
+        state["views"] = None
+        return state
+
+    def arrays(self):
+        if self.views is None:
+            self.views = (self.arena.numpy(), self.slot_of.numpy(), self.owner.numpy(),
+                          self.last_used.numpy(), self.shapes.numpy(), self.counters.numpy())
+        return self.views
+
+    def get(self, key):
+        arena, slot_of, _, last_used, shapes, counters = self.arrays()
+        key_idx = self.key_index.get(key, -1)
+
+        with self.lock:
+            slot = slot_of[key_idx] if key_idx >= 0 else -1
+            if slot < 0:
+                counters[MISSES] += 1
+                return None
+
+            counters[HITS] += 1
+            counters[CLOCK] += 1
+            last_used[slot] = counters[CLOCK]
+
+            shape = tuple(shapes[slot])
+            start = slot * self.slot_bytes
+            clip = arena[start:start + int(np.prod(shape))].reshape(shape).copy()
+
+        return clip
+
+    def put(self, key, clip):
+        key_idx = self.key_index.get(key, -1)
+        if key_idx < 0 or clip.dtype != np.uint8 or clip.ndim != 4 or clip.nbytes > self.slot_bytes or self.num_slots == 0:
+            return
+
+        arena, slot_of, owner, last_used, shapes, counters = self.arrays()
+
+        with self.lock:
+            if slot_of[key_idx] >= 0:
+                return
+
+            # free slots were never used, so they come out of argmin first
+            slot = int(np.argmin(last_used))
+            if owner[slot] >= 0:
+                slot_of[owner[slot]] = -1
+                counters[EVICTIONS] += 1
+
+            start = slot * self.slot_bytes
+            arena[start:start + clip.nbytes] = clip.reshape(-1)
+            shapes[slot] = clip.shape
+
+            owner[slot] = key_idx
+            slot_of[key_idx] = slot
+            counters[CLOCK] += 1
+            last_used[slot] = counters[CLOCK]
+
+    def stats(self):
+        _, _, owner, _, _, counters = self.arrays()
+
+        hits = int(counters[HITS])
+        misses = int(counters[MISSES])
+        lookups = hits + misses
+
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": int(counters[EVICTIONS]),
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "cached_clips": int(np.count_nonzero(owner >= 0)),
+            "slots": self.num_slots,
+            "budget_bytes": self.budget_bytes,
+        }
@@ -0,0 +1,88 @@
+import zlib
+import threading
+import cv2
+import numpy as np
+
+# per-frame codecs for compressed clip stores. every frame is its own blob so a sample
+# only decodes the frames the sampler picked, and the frames of one clip can be decoded
+# in parallel (zlib, zstd, lz4 and cv2.imdecode all release the GIL).
+#   zlib / zstd / lz4  lossless over the raw HxWxC bytes
+#   jpeg               lossy, frames are BGR like the .npy clips so no colour swap is needed
+# zstd and lz4 need the zstandard / lz4 packages, zlib and jpeg work out of the box
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+CODECS = ("raw", "zlib", "zstd", "lz4", "jpeg")
+DEFAULT_LEVELS = {"zlib": 1, "zstd": 3, "lz4": 0, "jpeg": 90}
+
+local = threading.local()
+
+
+def check_codec(codec):
+    if codec not in CODECS:
+        raise ValueError(f"unknown clip codec {codec}, expected one of {CODECS}")
+    if codec == "zstd" and zstandard is None:
+        raise ImportError("the zstd clip codec needs the zstandard package")
+    if codec == "lz4" and lz4 is None:
+        raise ImportError("the lz4 clip codec needs the lz4 package")
+
+
+def zstd_context(kind, level=None):
+    # zstandard (de)compressor objects must not be shared between threads. compressors are kept
+    # per level, so a writer asking for another level than an earlier one on this thread gets it
+    name = f"zstd_{kind}_{level}" if kind == "compressor" else "zstd_" + kind
+    context = getattr(local, name, None)
+    if context is None:
+        if kind == "compressor":
+            context = zstandard.ZstdCompressor(level=level)
+        else:
+            context = zstandard.ZstdDecompressor()
+        setattr(local, name, context)
+    return context
+
+
+def encode_frame(codec, frame, level=None):
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+
+    if codec == "zlib":
+        return zlib.compress(frame.tobytes(), level)
+    if codec == "zstd":
+        return zstd_context("compressor", level).compress(frame.tobytes())
+    if codec == "lz4":
+        return lz4.frame.compress(frame.tobytes(), compression_level=level)
+    if codec == "jpeg":
+        if frame.ndim != 3 or frame.shape[2] != 3:
+            raise ValueError(f"jpeg clips need HxWx3 frames, got {frame.shape}")
+        ok, blob = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, level])
+        if not ok:
+            raise ValueError("jpeg encoding failed")
+        return blob.tobytes()
+
+    raise ValueError(f"codec {codec} does not compress frames")
+
+
+def decode_frame(codec, blob, out):
+    # out is the preallocated HxWxC slot the frame is written into
+    if codec == "jpeg":
+        out[...] = cv2.imdecode(np.frombuffer(blob, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return
+
+    if codec == "zlib":
+        data = zlib.decompress(blob, bufsize=out.nbytes)
+    elif codec == "zstd":
+        data = zstd_context("decompressor").decompress(blob, max_output_size=out.nbytes)
+    elif codec == "lz4":
+        data = lz4.frame.decompress(blob)
+    else:
+        raise ValueError(f"codec {codec} does not compress frames")
+
+    out.reshape(-1)[:] = np.frombuffer(data, dtype=np.uint8)
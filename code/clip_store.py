@@ -0,0 +1,242 @@
+import os
+import json
+import pickle
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from clip_codec import check_codec, encode_frame, decode_frame
+from atomic_file import atomic_json
+
+# a clip store is two files next to each other:
+#   <path>.bin         every clip's uint8 frames back to back
+#   <path>.index.json  {"clips": {clip_id: [offset, [T, H, W, C]]}}
+# reading a clip is a slice of one np.memmap, so no file is opened per sample.
+# compressed stores ("codec" in the index, see clip_codec.py) keep one blob per frame:
+#   {"codec": codec, "clips": {clip_id: [offset, [T, H, W, C], [frame blob sizes]]}}
+# and decode just the requested frames on a small thread pool
+
+DECODE_THREADS = 4
+
+
+def store_paths(path):
+    return path + ".bin", path + ".index.json"
+
+
+class ClipStore:
+    def __init__(self, path, threads=DECODE_THREADS):
+        self.path = path
+        self.data_path, self.index_path = store_paths(path)
+        self.threads = threads
+
+        with open(self.index_path, 'r') as f:
+            index = json.load(f)
+
+        self.codec = index.get("codec", "raw")
+        check_codec(self.codec)
+
+        self.clips = {}
+        self.frame_bounds = {}
+        for clip_id, entry in index["clips"].items():
+            offset, shape = entry[0], tuple(entry[1])
+            self.clips[clip_id] = (offset, shape)
+            if self.codec != "raw":
+                self.frame_bounds[clip_id] = offset + np.concatenate([[0], np.cumsum(entry[2], dtype=np.int64)])
+
+        self.data = None
+        self.pool = None
+        self.pool_pid = None
+
+    def __len__(self):
+        return len(self.clips)
+
+    def __contains__(self, clip_id):
+        return clip_id in self.clips
+
+    def keys(self):
+        return self.clips.keys()
+
+    def shape(self, clip_id):
+        return self.clips[clip_id][1]
+
+    def num_frames(self, clip_id):
+        return self.clips[clip_id][1][0]
+
+    def mapped(self):
+        # opened lazily so every DataLoader worker maps the file itself
+        if self.data is None:
+            self.data = np.memmap(self.data_path, dtype=np.uint8, mode='c')
+        return self.data
+
+    def decode_pool(self):
+        # threads do not survive a fork, so each worker process starts its own pool
+        if self.pool is None or self.pool_pid != os.getpid():
+            self.pool = ThreadPoolExecutor(self.threads)
+            self.pool_pid = os.getpid()
+        return self.pool
+
+    def get(self, clip_id):
+        offset, shape = self.clips[clip_id]
+
+        if self.codec != "raw":
+            return self.read(clip_id, np.arange(shape[0]))
+
+        size = int(np.prod(shape))
+        return self.mapped()[offset:offset + size].reshape(shape)
+
+    def read(self, clip_id, indices, out=None):
+        # frames `indices` of a clip, -1 entries (only ever at the tail) come back as zeros
+        shape = self.clips[clip_id][1]
+        if out is None:
+            out = np.empty((len(indices),) + shape[1:], dtype=np.uint8)
+
+        valid = int(np.count_nonzero(indices >= 0))
+        if self.codec == "raw":
+            np.take(self.get(clip_id), indices[:valid], axis=0, out=out[:valid])
+        else:
+            self.decode(clip_id, indices[:valid], out[:valid])
+        out[valid:] = 0
+
+        return out
+
+    def decode(self, clip_id, indices, out):
+        data = self.mapped()
+        bounds = self.frame_bounds[clip_id]
+
+        def decode_one(i):
+            frame = indices[i]
+            decode_frame(self.codec, data[bounds[frame]:bounds[frame + 1]], out[i])
+
+        if self.threads > 1 and len(indices) > 1:
+            list(self.decode_pool().map(decode_one, range(len(indices))))
+        else:
+            for i in range(len(indices)):
+                decode_one(i)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["data"] = None
+        state["pool"] = None
+        state["pool_pid"] = None
+        return state
+
+
+class ClipStoreWriter:
+    def __init__(self, path, codec="raw", level=None, threads=DECODE_THREADS):
+        self.path = path
+        self.data_path, self.index_path = store_paths(path)
+        self.codec = codec
+        self.level = level
+        self.pool = ThreadPoolExecutor(threads) if codec != "raw" else None
+
+        check_codec(codec)
+
+        out_dir = os.path.dirname(path)
+        if out_dir and not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+
+        # reopening an existing store appends to it
+        self.clips = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index.get("codec", "raw") != codec:
+                raise ValueError(f"{path} is a {index.get('codec', 'raw')} store, cannot append {codec} clips")
+            self.clips = index["clips"]
+
+        self.data_file = open(self.data_path, 'ab')
+        self.data_file.seek(0, os.SEEK_END)
+        self.offset = self.data_file.tell()
+
+    def __contains__(self, clip_id):
+        return clip_id in self.clips
+
+    def add(self, clip_id, frames):
+        frames = np.ascontiguousarray(frames, dtype=np.uint8)
+
+        if self.codec == "raw":
+            self.data_file.write(frames.tobytes())
+            self.clips[clip_id] = [self.offset, list(frames.shape)]
+            self.offset += frames.nbytes
+            return
+
+        blobs = list(self.pool.map(lambda frame: encode_frame(self.codec, frame, self.level), frames))
+        for blob in blobs:
+            self.data_file.write(blob)
+
+        sizes = [len(blob) for blob in blobs]
+        self.clips[clip_id] = [self.offset, list(frames.shape), sizes]
+        self.offset += sum(sizes)
+
+    def close(self):
+        self.data_file.close()
+        if self.pool is not None:
+            self.pool.shutdown()
+        self.write_index()
+
+    def flush(self):
+        # makes everything added so far visible to readers (and survive a crash)
+        self.data_file.flush()
+        os.fsync(self.data_file.fileno())
+        self.write_index()
+
+    def write_index(self):
+        index = {"clips": self.clips}
+        if self.codec != "raw":
+            index["codec"] = self.codec
+
+        atomic_json(self.index_path, index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_clip_file(path):
+    if path.endswith(".npy"):
+        return np.load(path)
+
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def pack_directory(src_dir, out_path, clip_ids=None, codec="raw", level=None):
+    # packs the .npy / .pkl clips written by helpers/convert_npy.py and helpers/pkl_convert.py,
+    # compressing them on the way when a codec is given
+    files = {}
+    for file in sorted(os.listdir(src_dir)):
+        clip_id, ext = os.path.splitext(file)
+        if ext in (".npy", ".pkl"):
+            files[clip_id] = os.path.join(src_dir, file)
+
+    if clip_ids is None:
+        clip_ids = list(files.keys())
+
+    missing = 0
+    with ClipStoreWriter(out_path, codec, level) as writer:
+        for clip_id in clip_ids:
+            if clip_id in writer:
+                continue
+            if clip_id not in files:
+                missing += 1
+                continue
+            writer.add(clip_id, load_clip_file(files[clip_id]))
+
+        packed = len(writer.clips)
+
+    print(f"packed {packed} {codec} clips from {src_dir} into {out_path}.bin, {missing} missing")
+
+
+def main():
+    video_npy = "../../dissData/video_npy"
+    video_npy_reduced = "../../dissData/video_npy_reduced"
+    store_dir = "../../dissData/clip_store"
+
+    for split in ["train", "valid", "test"]:
+        pack_directory(os.path.join(video_npy, split), os.path.join(store_dir, split))
+
+    pack_directory(os.path.join(video_npy_reduced, "allVids"), os.path.join(store_dir, "allVids"))
+    pack_directory(os.path.join(video_npy_reduced, "allVids"), os.path.join(store_dir, "allVids_jpeg"), codec="jpeg")
+
+if __name__ == "__main__":
+    main()
@@ -2,33 +2,41 @@ import os
 import torch
 from torch.utils.data import Dataset
 import pickle
+import numpy as np
+from temporal_sampler import TemporalSampler
+from motion_energy import dataset_energies
+from manifest import load_manifest
 
 class VideoDataset(Dataset):
-    def __init__(self, root_dir, labels_file, transform=None, num_frames=32):
+    def __init__(self, root_dir, labels_file, transform=None, num_frames=32, sampling="head", jitter=False, cache=None, energy=None):
         self.root_dir = root_dir
         self.labels = self.load_labels(labels_file)
         self.video_ids = list(self.labels.keys())
+
+        # with a manifest (manifest.py) shapes are known up front and bad clips are left out
+        self.manifest = load_manifest(root_dir)
+        if self.manifest is not None:
+            self.video_ids = self.manifest.usable(self.video_ids)
         self.transform = transform
         self.num_frames = num_frames
+        self.cache = cache
+
+        # pickles have no cheap header, so without a manifest rows are filled in as clips are first loaded
+        energies = dataset_energies(root_dir, self.video_ids, sampling, energy)
+        self.sampler = TemporalSampler(num_frames, sampling, jitter)
+        if self.manifest is not None:
+            self.sampler.build([self.manifest.shape(video_id)[0] for video_id in self.video_ids], energies)
+        else:
+            self.sampler.build([-1] * len(self.video_ids), energies)
 
     def __len__(self):
         return len(self.video_ids)
 
     def __getitem__(self, idx):
         video_id = self.video_ids[idx]
-        video_path = os.path.join(self.root_dir, f"{video_id}.pkl")
-
-        # Load frames from pickle file
-        with open(video_path, 'rb') as file:
-            frames_array = pickle.load(file)
-
-        frames_tensor = torch.from_numpy(frames_array)
 
-        # Ensure consistent number of frames
-        if len(frames_tensor) < self.num_frames:
-            frames_tensor = torch.cat([frames_tensor, torch.zeros(self.num_frames - len(frames_tensor), *frames_tensor.shape[1:])], dim=0)
-        elif len(frames_tensor) > self.num_frames:
-            frames_tensor = frames_tensor[:self.num_frames]
+        frames_array = self.load_clip(video_id)
+        frames_tensor = torch.from_numpy(self.sampler.sample(idx, frames_array))
 
         classification_label, score_label = self.labels[video_id]
 
@@ -38,6 +46,33 @@ class VideoDataset(Dataset):
         return frames_tensor, classification_label_tensor, score_label_tensor
 
     def load_labels(self, labels_file):
+        # a label_table.LabelView can be passed in place of a pickle path
+        if not isinstance(labels_file, str):
+            return labels_file
+
         with open(labels_file, 'rb') as file:
             labels = pickle.load(file)
-        return labels
\ No newline at end of file
+        return labels
+
+    def load_clip(self, video_id):
+        if self.cache is not None:
+            frames_array = self.cache.get(video_id)
+            if frames_array is not None:
+                return frames_array
+
+        video_path = os.path.join(self.root_dir, f"{video_id}.pkl")
+
+        # Load frames from pickle file
+        with open(video_path, 'rb') as file:
+            frames_array = pickle.load(file)
+
+        if self.cache is not None:
+            self.cache.put(video_id, frames_array)
+        return frames_array
+
+    def max_clip_bytes(self):
+        if self.manifest is not None:
+            return max([int(np.prod(self.manifest.shape(video_id))) for video_id in self.video_ids] + [0])
+
+        # every pickle is written with the same shape, so the first one is representative
+        return self.load_clip(self.video_ids[0]).nbytes if self.video_ids else 0
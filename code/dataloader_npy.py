@@ -3,37 +3,79 @@ import pickle
 import torch
 from torch.utils.data import Dataset
 import numpy as np
+from temporal_sampler import TemporalSampler
+from motion_energy import dataset_energies
+from manifest import load_manifest
 
 class VideoDataset(Dataset):
-    def __init__(self, root_dir, labels_file, transform=None, num_frames=16):
+    def __init__(self, root_dir, labels_file, transform=None, num_frames=16, sampling="head", jitter=False, cache=None, energy=None):
         self.root_dir = root_dir
         self.labels = self.load_labels(labels_file)
         self.video_ids = list(self.labels.keys())
+
+        # with a manifest (manifest.py) shapes are known up front and bad clips are left out
+        self.manifest = load_manifest(root_dir)
+        if self.manifest is not None:
+            self.video_ids = self.manifest.usable(self.video_ids)
         self.transform = transform
         self.num_frames = num_frames
+        self.cache = cache
+
+        self.clip_shapes = [self.clip_shape(video_id) for video_id in self.video_ids]
+
+        energies = dataset_energies(root_dir, self.video_ids, sampling, energy)
+        self.sampler = TemporalSampler(num_frames, sampling, jitter)
+        self.sampler.build([shape[0] if shape else -1 for shape in self.clip_shapes], energies)
 
     def __len__(self):
         return len(self.video_ids)
 
     def __getitem__(self, idx):
         video_id = self.video_ids[idx]
-        video_path = os.path.join(self.root_dir, f"{video_id}.npy")
 
-        frames_tensor = torch.from_numpy(np.load(video_path))
+        clip = self.load_clip(video_id)
+        frames_tensor = torch.from_numpy(self.sampler.sample(idx, clip))
 
-        if len(frames_tensor) < self.num_frames:
-            frames_tensor = torch.cat([frames_tensor, torch.zeros(self.num_frames - len(frames_tensor), *frames_tensor.shape[1:])], dim=0)
-        elif len(frames_tensor) > self.num_frames:
-            frames_tensor = frames_tensor[:self.num_frames]
+        return (frames_tensor,) + self.label_tensors(video_id)
 
+    def label_tensors(self, video_id):
         classification_label, score_label = self.labels[video_id]
 
         classification_label_tensor = torch.tensor(classification_label, dtype=torch.float32)
         score_label_tensor = torch.tensor(score_label, dtype=torch.float32)
 
-        return frames_tensor, classification_label_tensor, score_label_tensor
+        return classification_label_tensor, score_label_tensor
 
     def load_labels(self, labels_file):
+        # a label_table.LabelView can be passed in place of a pickle path
+        if not isinstance(labels_file, str):
+            return labels_file
+
         with open(labels_file, 'rb') as file:
             labels = pickle.load(file)
-        return labels
\ No newline at end of file
+        return labels
+
+    def load_clip(self, video_id):
+        video_path = os.path.join(self.root_dir, f"{video_id}.npy")
+
+        if self.cache is None:
+            return np.load(video_path, mmap_mode='r')
+
+        clip = self.cache.get(video_id)
+        if clip is None:
+            clip = np.load(video_path)
+            self.cache.put(video_id, clip)
+        return clip
+
+    def clip_shape(self, video_id):
+        if self.manifest is not None:
+            return self.manifest.shape(video_id)
+
+        # only the .npy header is read; None lets the sampler fill the row in on first load
+        try:
+            return np.load(os.path.join(self.root_dir, f"{video_id}.npy"), mmap_mode='r').shape
+        except (OSError, ValueError):
+            return None
+
+    def max_clip_bytes(self):
+        return max([int(np.prod(shape)) for shape in self.clip_shapes if shape] + [0])
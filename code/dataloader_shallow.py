@@ -0,0 +1,24 @@
+import torch
+from torch.utils.data import Dataset
+from shallow_crops import ShallowCrops
+
+# one sample per video: every crop of that video as a (frames, 299, 299, 3) uint8 stack, which is
+# a slice of the archive memmap (no copy), and the per frame shallow depth labels (-1 = none).
+# videos have different frame counts, so batch with batch_size=1 or collate them yourself
+
+class VideoDataset(Dataset):
+    def __init__(self, archive_path, split=None, transform=None):
+        self.crops = ShallowCrops(archive_path)
+        self.video_ids = self.crops.video_ids(split)
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.video_ids)
+
+    def __getitem__(self, idx):
+        video_id = self.video_ids[idx]
+
+        frames_tensor = torch.from_numpy(self.crops.stack(video_id))
+        label_tensor = torch.from_numpy(self.crops.labels(video_id))
+
+        return frames_tensor, label_tensor
@@ -0,0 +1,75 @@
+import os
+import pickle
+import torch
+import numpy as np
+from torch.utils.data import Dataset
+from clip_store import ClipStore
+from temporal_sampler import TemporalSampler
+from motion_energy import dataset_energies
+
+class VideoDataset(Dataset):
+    def __init__(self, store_path, labels_file, transform=None, num_frames=16, sampling="head", jitter=False, cache=None, energy=None):
+        self.store = ClipStore(store_path)
+        self.labels = self.load_labels(labels_file)
+        self.video_ids = [video_id for video_id in self.labels.keys() if video_id in self.store]
+        self.transform = transform
+        self.num_frames = num_frames
+        self.cache = cache
+
+        # the motion energy table is looked for next to the store (<store dir>/motion_energy.npz)
+        energies = dataset_energies(os.path.dirname(os.path.abspath(store_path)), self.video_ids, sampling, energy)
+        self.sampler = TemporalSampler(num_frames, sampling, jitter)
+        self.sampler.build([self.store.num_frames(video_id) for video_id in self.video_ids], energies)
+
+    def __len__(self):
+        return len(self.video_ids)
+
+    def __getitem__(self, idx):
+        video_id = self.video_ids[idx]
+
+        if self.cache is None:
+            # only the sampled frames are read (and decoded, for compressed stores)
+            frames = self.store.read(video_id, self.sampler.indices(idx))
+        else:
+            frames = self.sampler.sample(idx, self.load_clip(video_id))
+
+        frames_tensor = torch.from_numpy(frames)
+
+        label = self.labels[video_id]
+
+        # [class, score] labels (train.pkl and friends) or a single label (pipe labels)
+        if isinstance(label, (list, tuple)):
+            classification_label, score_label = label
+
+            classification_label_tensor = torch.tensor(classification_label, dtype=torch.float32)
+            score_label_tensor = torch.tensor(score_label, dtype=torch.float32)
+
+            return frames_tensor, classification_label_tensor, score_label_tensor
+
+        label_tensor = torch.tensor(label, dtype=torch.float32)
+
+        return frames_tensor, label_tensor
+
+    def load_labels(self, labels_file):
+        # a label_table.LabelView can be passed in place of a pickle path
+        if not isinstance(labels_file, str):
+            return labels_file
+
+        with open(labels_file, 'rb') as file:
+            labels = pickle.load(file)
+        return labels
+
+    def load_clip(self, video_id):
+        # the memmap is already served from the OS page cache, the clip cache only adds a
+        # fixed RAM budget on top of it
+        if self.cache is None:
+            return self.store.get(video_id)
+
+        clip = self.cache.get(video_id)
+        if clip is None:
+            clip = self.store.get(video_id)
+            self.cache.put(video_id, clip)
+        return clip
+
+    def max_clip_bytes(self):
+        return max([int(np.prod(self.store.shape(video_id))) for video_id in self.video_ids] + [0])
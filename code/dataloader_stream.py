@@ -0,0 +1,92 @@
+import os
+import pickle
+import torch
+import numpy as np
+from torch.utils.data import IterableDataset, get_worker_info
+from temporal_sampler import TemporalSampler
+from motion_energy import dataset_energies
+from video_decode import open_video, read_frames
+
+# trains straight from the .mp4 files, no convert_npy / pkl_convert pass needed first.
+# each worker owns every num_workers-th video of the (per epoch) shuffled order, asks the
+# sampler which frames it needs and decodes just those, resized on the way out
+
+class VideoDataset(IterableDataset):
+    def __init__(self, video_dir, labels_file, transform=None, num_frames=16, resize_shape=(112, 112),
+                 sampling="uniform", jitter=False, shuffle=False, seed=0, energy=None):
+        self.video_dir = video_dir
+        self.labels = self.load_labels(labels_file)
+        self.video_ids = list(self.labels.keys())
+        self.transform = transform
+        self.num_frames = num_frames
+        self.resize_shape = resize_shape
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+        # frame counts come from the container when a video is first opened
+        energies = dataset_energies(video_dir, self.video_ids, sampling, energy)
+        self.sampler = TemporalSampler(num_frames, sampling, jitter)
+        self.sampler.build([-1] * len(self.video_ids), energies)
+
+    def __len__(self):
+        return len(self.video_ids)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def worker_order(self):
+        order = np.arange(len(self.video_ids))
+        worker_info = get_worker_info()
+
+        if self.shuffle:
+            # every worker shuffles with the same seed, so the shards never overlap. workers are
+            # handed a fresh copy of the dataset each epoch (unless persistent_workers is on), so
+            # their epoch counter never moves; the DataLoader's base seed, which it draws anew for
+            # every epoch and is worker seed - worker id in all of them, keeps the order changing
+            seed = self.seed + self.epoch
+            if worker_info is not None:
+                seed += worker_info.seed - worker_info.id
+            np.random.default_rng(seed).shuffle(order)
+
+        if worker_info is None:
+            return order
+        return order[worker_info.id::worker_info.num_workers]
+
+    def __iter__(self):
+        order = self.worker_order()
+        self.epoch += 1
+
+        for idx in order:
+            video_id = self.video_ids[idx]
+            video_path = os.path.join(self.video_dir, f"{video_id}.mp4")
+
+            cap, frame_count = open_video(video_path)
+            if cap is None:
+                print(f"could not open {video_path}, skipping")
+                continue
+
+            try:
+                frames = read_frames(cap, self.sampler.indices(idx, frame_count), self.resize_shape)
+            finally:
+                cap.release()
+
+            yield (torch.from_numpy(frames),) + self.label_tensors(video_id)
+
+    def label_tensors(self, video_id):
+        label = self.labels[video_id]
+
+        if isinstance(label, (list, tuple)):
+            classification_label, score_label = label
+            return torch.tensor(classification_label, dtype=torch.float32), torch.tensor(score_label, dtype=torch.float32)
+
+        return (torch.tensor(label, dtype=torch.float32),)
+
+    def load_labels(self, labels_file):
+        # a label_table.LabelView can be passed in place of a pickle path
+        if not isinstance(labels_file, str):
+            return labels_file
+
+        with open(labels_file, 'rb') as file:
+            labels = pickle.load(file)
+        return labels
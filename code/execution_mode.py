@@ -0,0 +1,96 @@
+import os
+import functools
+import torch
+
+# opt-in faster execution for the 3D CNNs, picked with the EXECUTION_MODE environment variable
+# so the .sh launchers can switch it without touching the trainers:
+#   eager          default NCDHW layout, no compilation (what the trainers always did)
+#   channels_last  conv weights and input batches in channels_last_3d (NDHWC in memory)
+#   compiled       channels_last plus torch.compile on the model, compiled in place so
+#                  state_dict keys (and the saved checkpoints) stay the same
+# inductor's compiled kernels and graphs are kept in COMPILE_CACHE, so only the first run on a
+# machine pays the full compile time. anything dynamo or inductor cannot handle falls back to
+# eager for that part of the model instead of stopping the run.
+# PRECISION=bf16 turns on bfloat16 autocast in the train and eval loops: convolutions and
+# linear layers run in bfloat16 while the weights and optimizer state stay float32, and the
+# ops autocast keeps in float32 stay there. outputs go back to float32 (float_outputs) before
+# the losses and metrics, so those are always computed in float32
+
+MODES = ("eager", "channels_last", "compiled")
+PRECISIONS = ("fp32", "bf16")
+COMPILE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".compile_cache")
+
+
+def execution_mode():
+    mode = os.environ.get("EXECUTION_MODE", "eager")
+    if mode not in MODES:
+        raise ValueError(f"EXECUTION_MODE must be one of {MODES}, got {mode}")
+    return mode
+
+
+def memory_format(mode=None):
+    # what BatchTransform should lay its output out as for the models prepared with mode
+    mode = mode or execution_mode()
+    return torch.contiguous_format if mode == "eager" else torch.channels_last_3d
+
+
+def enable_compile_cache(cache_dir=COMPILE_CACHE):
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", cache_dir)
+    import torch._inductor.config
+    torch._inductor.config.fx_graph_cache = True
+
+
+def compile_model(model):
+    if not hasattr(model, "compile"):
+        print(f"torch {torch.__version__} has no nn.Module.compile, running {type(model).__name__} eagerly")
+        return model
+
+    enable_compile_cache()
+    import torch._dynamo
+    torch._dynamo.config.suppress_errors = True
+
+    try:
+        model.compile()
+    except Exception as e:
+        print(f"torch.compile failed for {type(model).__name__} ({e}), running it eagerly")
+    return model
+
+
+def prepare_model(model, mode=None):
+    # call after model.to(device); returns the same module
+    mode = mode or execution_mode()
+    if mode == "eager":
+        return model
+
+    model = model.to(memory_format=torch.channels_last_3d)
+    if mode == "compiled":
+        model = compile_model(model)
+    print(f"{type(model).__name__}: {mode} execution")
+    return model
+
+
+def precision():
+    mode = os.environ.get("PRECISION", "fp32")
+    if mode not in PRECISIONS:
+        raise ValueError(f"PRECISION must be one of {PRECISIONS}, got {mode}")
+    return mode
+
+
+@functools.lru_cache(maxsize=None)
+def bf16_supported(device_type):
+    if device_type == "cuda" and not torch.cuda.is_bf16_supported():
+        print("this GPU has no bfloat16 support, running in float32")
+        return False
+    return True
+
+
+def autocast(device, mode=None):
+    device_type = torch.device(device).type
+    enabled = (mode or precision()) == "bf16" and bf16_supported(device_type)
+    return torch.autocast(device_type=device_type, dtype=torch.bfloat16, enabled=enabled)
+
+
+def float_outputs(output):
+    if isinstance(output, dict):
+        return {name: value.float() for name, value in output.items()}
+    return output.float()
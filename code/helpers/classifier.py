@@ -2,10 +2,13 @@ import time
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
 from torch.utils.tensorboard import SummaryWriter
 from model import C3DC, FullyConnected, ScoreRegressor, EndToEndModel, ClassifierCNN3D
 from dataloader_npy import VideoDataset
+from batch_transform import BatchTransform
+from loader_factory import make_loader
+from prefetcher import BatchPrefetcher
+from execution_mode import memory_format, prepare_model, autocast, float_outputs
 
 def print_metrics(epoch, loss, data_load_time, step_time, accuracy, type):
         epoch_step = step % len(video_dataset)
@@ -42,6 +45,8 @@ if torch.cuda.is_available():
 else:
     device = torch.device("cpu")
 
+to_input = BatchTransform(device, scale=1.0, memory_format=memory_format())
+
 step = 0
 log_frequency = 5
 running_loss_print_freq = 50
@@ -60,14 +65,15 @@ labels_test = "../labels/valid_labels/valid.pkl"
 test_vids = "../../dissData/video_npy/valid"
 video_dataset_test = VideoDataset(test_vids, labels_test, transform=None, num_frames=16)
 
-train_data_loader = DataLoader(video_dataset, batch_size=batch_size, shuffle=True)
-validation_data = DataLoader(video_dataset_valid, batch_size)
-test_data_loader = DataLoader(video_dataset_test, batch_size)
+train_data_loader = BatchPrefetcher(make_loader(video_dataset, batch_size, shuffle=True), to_input)
+validation_data = BatchPrefetcher(make_loader(video_dataset_valid, batch_size), to_input)
+test_data_loader = BatchPrefetcher(make_loader(video_dataset_test, batch_size), to_input)
 
 
 classifier = ClassifierCNN3D()
 
 classifier = classifier.to(device)
+classifier = prepare_model(classifier)
 
 
 criterion_classification = nn.BCELoss()
@@ -81,7 +87,6 @@ num_epochs = 50
 print("loaded all models, going into training loop")
 for epoch in range(num_epochs):
     print('-------------------------------------------------------------------------------------------------------')
-    data_load_start_time = time.time()
     classification_running_loss = 0.0
     scorer_running_loss = 0.0
     total_samples = 0
@@ -91,15 +96,16 @@ for epoch in range(num_epochs):
     threshold = 0.5
     classifier.train()
     for _, batch_data in enumerate(train_data_loader):
-        frames = batch_data[0].type(torch.FloatTensor).to(device)
-        frames = frames.permute(0, 4, 1, 2, 3)
-        classification_labels = batch_data[1].type(torch.FloatTensor).to(device)
+        frames = batch_data[0]
+        classification_labels = batch_data[1]
 
         data_load_end_time = time.time()
         
         optimizer.zero_grad()
             
-        outputs = classifier(frames)
+        with autocast(device):
+            outputs = classifier(frames)
+        outputs = float_outputs(outputs)
         classification_output = outputs['classification']
 
         classification_loss = criterion_classification(classification_output, classification_labels.float().view(-1, 1))
@@ -119,7 +125,7 @@ for epoch in range(num_epochs):
             print(f"average running loss per mini batch of classification loss: {classification_running_loss / batch_size:.3f} at [epoch, step]: {[epoch+1, step+1]}")
             print(f"average running loss per mini batch of scorer loss: {scorer_running_loss / batch_size:.3f} at [epoch, step]: {[epoch+1, step+1]}")
 
-        data_load_time = data_load_end_time - data_load_start_time
+        data_load_time = train_data_loader.last_stall
         step_time = time.time() - data_load_end_time
         
         accuracy_class = correct_predictions_class / total_samples
@@ -2,10 +2,13 @@ import time
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
 from torch.utils.tensorboard import SummaryWriter
 from models import ClassifierCNN3D
 from dataloader_npy import VideoDataset
+from batch_transform import BatchTransform
+from loader_factory import make_loader
+from prefetcher import BatchPrefetcher
+from execution_mode import memory_format, prepare_model, autocast, float_outputs
 
 print("starting")
 
@@ -49,6 +52,8 @@ if torch.cuda.is_available():
 else:
     device = torch.device("cpu")
 
+to_input = BatchTransform(device, scale=1.0, memory_format=memory_format())
+
 print_frequency = 20
 
 classifier = ClassifierCNN3D()
@@ -59,9 +64,10 @@ video_dataset = VideoDataset(sample_vids, labels_path, transform=None, num_frame
 
 batch_size = 16
 
-data_loader = DataLoader(video_dataset, batch_size=batch_size, shuffle=True)
+data_loader = BatchPrefetcher(make_loader(video_dataset, batch_size, shuffle=True), to_input)
 
 classifier = classifier.to(device)
+classifier = prepare_model(classifier)
 
 criterion_classification = nn.BCELoss()
 
@@ -73,7 +79,6 @@ num_epochs = 50
 print("loaded all models, going into training loop")
 for epoch in range(num_epochs):
     print('-------------------------------------------------------------------------------------------------------')
-    data_load_start_time = time.time()
     classification_running_loss = 0.0
     total_samples = 0
     correct_predictions_class = 0
@@ -81,9 +86,8 @@ for epoch in range(num_epochs):
     for _, batch_data in enumerate(data_loader):
         if epoch == 1:
             break
-        frames = batch_data[0].type(torch.FloatTensor).to(device)
-        frames = frames.permute(0, 4, 1, 2, 3)
-        classification_labels = batch_data[1].type(torch.FloatTensor).to(device)
+        frames = batch_data[0]
+        classification_labels = batch_data[1]
 
         data_load_end_time = time.time()
 
@@ -91,7 +95,9 @@ for epoch in range(num_epochs):
         
         optimizer.zero_grad()
             
-        outputs = classifier(frames)
+        with autocast(device):
+            outputs = classifier(frames)
+        outputs = float_outputs(outputs)
         classification_output = outputs.squeeze()
 
         classification_loss = criterion_classification(classification_output, classification_labels)
@@ -110,7 +116,7 @@ for epoch in range(num_epochs):
         if ((step+1) % running_loss_print_freq) == 0:
             print(f"average running loss per mini batch of classification loss: {classification_running_loss / batch_size:.3f} at [epoch, step]: {[epoch+1, step+1]}")
 
-        data_load_time = data_load_end_time - data_load_start_time
+        data_load_time = data_loader.last_stall
         step_time = time.time() - data_load_end_time
         
         # Compute accuracy
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import functools
+import numpy as np
+import cv2
+from multiprocessing import Pool
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from artifact_cache import artifact_key, code_version, link_file
+
+# runs a per-video converter (convert_npy.convert_video_to_npy, pkl_convert.convert_video_to_pkl)
+# over a process pool. every finished video is appended to a journal in the output folder with a
+# hash of the conversion parameters and the files it wrote, so running the same conversion again
+# after a crash or ctrl-c only does the videos still missing. a video is redone when it was
+# converted with other parameters (roi, frame_plan, resize_shape, ...) or its files are gone.
+# converters write through atomic_file.atomic_write, so an interrupted video never leaves a half
+# written file.
+# with an artifact_cache.ArtifactCache, videos are converted into the cache under a key of (the
+# video's content hash, the conversion parameters, a hash of the converter's code) and
+# hardlinked into the output folder, so another output folder asking for the same conversion
+# (or a rerun after the folder was deleted) links the files instead of decoding again
+
+JOURNAL_NAME = ".convert_journal.jsonl"
+REPORT_EVERY = 50
+
+
+def split_ids(labels):
+    # a split is just a list of ids into the one allVids folder: a label json / pickle path,
+    # or anything with keys() (a label dict, label_table.LabelView)
+    if not isinstance(labels, str):
+        return list(labels.keys())
+
+    if labels.endswith(".json"):
+        with open(labels, 'r') as f:
+            return list(json.load(f).keys())
+    with open(labels, 'rb') as f:
+        return list(pickle.load(f).keys())
+
+
+def param_value(value):
+    # json friendly stand-in for a conversion parameter; functions (a callable frame_plan, the
+    # converter) by qualified name, partials by their function and bound arguments
+    if isinstance(value, functools.partial):
+        return {"func": param_value(value.func), "args": param_value(list(value.args)),
+                "keywords": param_value(value.keywords)}
+    if callable(value):
+        return f"{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', repr(value))}"
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {str(key): param_value(item) for key, item in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [param_value(item) for item in value]
+    return value
+
+
+def params_hash(convert, args):
+    text = json.dumps([param_value(convert), param_value(list(args))], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def read_journal(journal_path):
+    # video id -> its last successful entry
+    done = {}
+    if not os.path.exists(journal_path):
+        return done
+
+    with open(journal_path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # last line of a run that died mid write
+                continue
+            if "error" not in entry:
+                done[entry["id"]] = entry
+    return done
+
+
+def is_done(entry, params, out_folder):
+    if entry is None or entry.get("params") != params:
+        return False
+    outputs = entry.get("outputs")
+    return bool(outputs) and all(os.path.exists(os.path.join(out_folder, name)) for name in outputs)
+
+
+def cache_version(convert):
+    # the converter's module and the decode / crop helpers it uses, if it loaded them
+    func = getattr(convert, "func", convert)
+    names = (func.__module__, "video_decode", "roi_crop")
+    return code_version(*[sys.modules[name] for name in names if name in sys.modules])
+
+
+def cache_key(cache, convert, args, version):
+    # args are (video path, output folder, ...): the folder does not change the files, while the
+    # video's name does since it is in the output names
+    video_path = args[0]
+    params = params_hash(convert, [os.path.basename(video_path)] + list(args[2:]))
+    return artifact_key(cache.source_hash(video_path), params, version)
+
+
+def link_outputs(paths, out_folder):
+    for path in paths:
+        link_file(path, os.path.join(out_folder, os.path.basename(path)))
+    return [os.path.basename(path) for path in paths]
+
+
+def init_worker():
+    # one decode thread per process, the pool already uses every core
+    cv2.setNumThreads(1)
+
+
+def run_job(job):
+    convert, video_id, args, params = job
+    start = time.time()
+    try:
+        frames, outputs = convert(*args)
+    except Exception as e:
+        return {"id": video_id, "error": f"{type(e).__name__}: {e}"}
+    if not frames:
+        # unreadable or missing video, retried on the next run like any other failure
+        return {"id": video_id, "error": "no frames decoded"}
+    return {"id": video_id, "frames": int(frames), "seconds": round(time.time() - start, 3),
+            "params": params, "outputs": outputs}
+
+
+def run_conversion(convert, jobs, out_folder, processes=None, cache=None):
+    # jobs: [(video_id, args for convert)], args starting with the video path and the output
+    # folder. convert returns how many frames it decoded and the names of the files it wrote
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    journal_path = os.path.join(out_folder, JOURNAL_NAME)
+    done = read_journal(journal_path)
+    todo = []
+    for video_id, args in jobs:
+        params = params_hash(convert, args)
+        if not is_done(done.get(video_id), params, out_folder):
+            todo.append((convert, video_id, args, params))
+    print(f"{out_folder}: {len(jobs) - len(todo)} videos already converted, {len(todo)} to go")
+
+    keys, cached = {}, []
+    if cache is not None:
+        todo, keys, cached = from_cache(cache, todo, out_folder)
+        print(f"{len(cached)} linked from {cache.root}, {len(todo)} to convert")
+
+    start = time.time()
+    videos, frames, failed = 0, 0, 0
+    with open(journal_path, 'a') as journal, Pool(processes, initializer=init_worker) as pool:
+        for entry in cached:
+            journal.write(json.dumps(entry) + "\n")
+
+        for entry in pool.imap_unordered(run_job, todo):
+            if cache is not None and "error" not in entry:
+                source, key, version = keys[entry["id"]]
+                paths = cache.add(key, source, param_value(convert), version, entry["outputs"], frames=entry["frames"])
+                link_outputs(paths, out_folder)
+
+            journal.write(json.dumps(entry) + "\n")
+            journal.flush()
+
+            if "error" in entry:
+                failed += 1
+                print(f"failed {entry['id']}: {entry['error']}")
+                continue
+
+            videos += 1
+            frames += entry["frames"]
+            if videos % REPORT_EVERY == 0:
+                report(videos, frames, failed, len(todo), time.time() - start)
+
+    report(videos, frames, failed, len(todo), time.time() - start)
+
+    if cache is not None:
+        cache.save()
+        if cache.budget_bytes is not None:
+            cache.gc(cache.budget_bytes, keep=set(key for _, key, _ in keys.values()))
+
+
+def from_cache(cache, todo, out_folder):
+    # links the videos the cache already has into out_folder (journal entries for them come
+    # back in cached) and points the rest at their cache folder
+    version = cache_version(todo[0][0]) if todo else None
+    misses, keys, cached = [], {}, []
+    for convert, video_id, args, params in todo:
+        if not os.path.exists(args[0]):
+            misses.append((convert, video_id, args, params))
+            continue
+
+        key = cache_key(cache, convert, args, version)
+        keys[video_id] = (args[0], key, version)
+        paths = cache.lookup(key)
+        if paths is None:
+            misses.append((convert, video_id, (args[0], cache.object_dir(key)) + tuple(args[2:]), params))
+            continue
+
+        cached.append({"id": video_id, "frames": cache.index[key].get("frames", 0), "seconds": 0.0,
+                       "params": params, "outputs": link_outputs(paths, out_folder), "cached": key})
+    return misses, keys, cached
+
+
+def report(videos, frames, failed, total, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    print(f"{videos}/{total} videos, {failed} failed, {videos / elapsed:.2f} videos/s, {frames / elapsed:.1f} frames/s")
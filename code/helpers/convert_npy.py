@@ -1,10 +1,23 @@
-import cv2
 import numpy as np
 import os
-import json
-
-def convert_video_to_npy(video_file, output_folder, num_frames=16, resize_shape=(256, 256)):
-    cap = cv2.VideoCapture(video_file)
+import sys
+from functools import partial
+from convert_engine import run_conversion, split_ids
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from video_decode import open_video, frame_size, decode_plan
+from atomic_file import atomic_write
+from artifact_cache import ArtifactCache
+from roi_crop import crop_window
+
+def convert_video_to_npy(video_file, output_folder, num_frames=16, resize_shape=(256, 256), frame_plan=None, roi=False):
+    # frame_plan: ascending frame indices to keep, or a function of the frame count returning
+    # them (None keeps every frame). they are written num_frames at a time as <id>_<k>.npy and
+    # decoding stops once the last one is read, so the cost follows the frames kept.
+    # roi crops every frame to the video's bar trajectory window (roi_crop.py) before resizing
+    cap, length = open_video(video_file)
+    if cap is None:
+        return 0, []
 
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
@@ -12,46 +25,43 @@ def convert_video_to_npy(video_file, output_folder, num_frames=16, resize_shape=
     filename = os.path.basename(video_file)
     filename_without_extension = os.path.splitext(filename)[0]
 
-    frame_count = 0
-    frames = []
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame = cv2.resize(frame, resize_shape)
-
-        frames.append(frame)
+    if frame_plan is None:
+        plan = np.arange(length)
+    elif callable(frame_plan):
+        plan = np.asarray(frame_plan(length))
+    else:
+        plan = np.asarray(frame_plan)
+    plan = plan[(plan >= 0) & (plan < length)]
 
-        if len(frames) == num_frames or not ret:
-            while len(frames) < num_frames:
-                frames.append(np.zeros_like(frames[0]))
+    window = crop_window(filename_without_extension, *frame_size(cap)) if roi else None
 
-            frames_array = np.array(frames)
+    try:
+        frames, decoded = decode_plan(cap, plan, resize_shape, window)
+    finally:
+        cap.release()
 
-            np.save(os.path.join(output_folder, f"{filename_without_extension}_{frame_count}.npy"), frames_array)
+    # only whole chunks are written, like before
+    outputs = []
+    for frame_count in range(decoded // num_frames):
+        frames_array = frames[frame_count * num_frames:(frame_count + 1) * num_frames]
 
-            frames = []
-            frame_count += 1
+        outputs.append(f"{filename_without_extension}_{frame_count}.npy")
+        atomic_write(os.path.join(output_folder, outputs[-1]), lambda f: np.save(f, frames_array))
 
-    cap.release()
+    return decoded, outputs
 
-def make_npy(vids_path, out_folder_path, lables_path):
-    with open(lables_path, 'r') as f:
-        labels_ = json.load(f)
-    
-    video_ids_dict = labels_.keys()
-    video_ids = []
-    for key in video_ids_dict:
-        video_ids.append(key)
-    
-    for id in video_ids:
+def make_npy(vids_path, out_folder_path, lables_path, roi=False, frame_plan=None, resize_shape=(256, 256), cache=None):
+    # vids_path is the shared allVids folder, the split only decides which ids are converted
+    jobs = []
+    for id in split_ids(lables_path):
         single_video_path = os.path.join(vids_path, f"{id}.mp4")
-        convert_video_to_npy(single_video_path, out_folder_path)
+        jobs.append((id, (single_video_path, out_folder_path)))
+
+    run_conversion(partial(convert_video_to_npy, roi=roi, frame_plan=frame_plan, resize_shape=resize_shape), jobs, out_folder_path, cache=cache)
 
 def main():
-    train_vids = "../train_vids"
-    test_vids = "../test_vids"
-    valid_vids = "../valid_vids"
+    all_vids = "../../dissData/allVids"
+    cache = ArtifactCache("../../dissData/artifacts", budget_bytes=200 * 1024 ** 3)
 
     test_out_folder = "./test"
     train_out_folder = "./train"
@@ -61,9 +71,9 @@ def main():
     test_labels_path = "../labels/test_data.json"
     valid_labels_path = "../labels/valid_data.json"
 
-    make_npy(train_vids, train_out_folder, train_labels_path)
-    make_npy(test_vids, test_out_folder, test_labels_path)
-    make_npy(valid_vids, valid_out_folder, valid_labels_path)
+    make_npy(all_vids, train_out_folder, train_labels_path, cache=cache)
+    make_npy(all_vids, test_out_folder, test_labels_path, cache=cache)
+    make_npy(all_vids, valid_out_folder, valid_labels_path, cache=cache)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
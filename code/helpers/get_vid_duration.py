@@ -1,28 +1,24 @@
-from moviepy.editor import VideoFileClip
 import os
+import sys
 import json
 
-def get_vid_length(path):
-    clip = VideoFileClip(path)
-    duration = clip.duration
-    clip.close()
-    return duration
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from video_probe import probe_directory
 
 def create_data(data_dir, out):
-    durations = {}
-
-    for file in os.listdir(data_dir):
-        if file.endswith(".mp4"):
-            vid_path = os.path.join(data_dir, file)
-            duration = get_vid_length(vid_path)
-            durations[file] = duration
+    # durations come from the mp4 headers (video_probe.py), nothing is decoded.
+    # keyed by video id and rounded to 1/100 s like labels/video_durations.json
+    metadata = probe_directory(data_dir)
+    durations = {video_id: round(meta["duration"], 2) for video_id, meta in metadata.items()}
 
     with open(out, 'w') as f:
         json.dump(durations, f, indent=4)
 
+def main():
+    dir = "../../dissData/allVids"
+    out_path = "../labels/video_durations.json"
 
+    create_data(dir, out_path)
 
-dir = "../../dissData/allVids"
-out_path = "../labels/video_durations.json"
-
-create_data(dir, out_path)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
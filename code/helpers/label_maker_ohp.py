@@ -1,28 +1,17 @@
-import json
+import os
+import sys
 
-data_path = "OHP/Labeled_Dataset/Labels/error_knees.json"
-vid_duration_path = "labels/video_durations.json"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from label_table import LABELS_DIR, OHP, update_scores, export_scores
 
-with open(data_path, 'r') as d:
-    file = json.load(d)
+# overhead press scores (10 points for knees) are built from the interval file by
+# label_table.compute_scores, overlapping intervals merged, and written into the label table;
+# labels/OHP_Aqa.json is re-exported from it for the older scripts
 
-with open(vid_duration_path, 'r') as dur:
-    durations = json.load(dur)
+def main():
+    table = update_scores()
+    scores = export_scores(table, OHP, os.path.join(LABELS_DIR, "OHP_Aqa.json"), decimals=1)
+    print(f"{len(scores)} overhead press scores")
 
-
-scores = {}
-for ids, labels in file.items():
-    if labels == []:
-        scores[ids] = 10
-    else:
-        for l in labels:
-            tmp_error_dur = l[1] - l[0]
-            total_durr = durations[ids]
-            score = ((total_durr - tmp_error_dur) * 10) / total_durr
-            scores[ids] = round(score, 1)
-
-
-
-out = "./labels/OHP_Aqa.json"
-with open(out, 'w') as f:
-    json.dump(scores, f, indent=4)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
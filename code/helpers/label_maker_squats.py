@@ -1,41 +1,17 @@
-import json
+import os
+import sys
 
-labels_path_knee_in = "Squat/Labeled_Dataset/Labels/error_knees_inward.json"
-labels_path_knee_out = "Squat/Labeled_Dataset/Labels/error_knees_forward.json"
-video_durations = "labels/video_durations.json"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from label_table import LABELS_DIR, SQUAT, update_scores, export_scores
 
-with open(labels_path_knee_in, 'r') as f:
-    data_knee_in = json.load(f)
+# squat scores (5 points for knees inward + 5 for knees forward) are built from the interval
+# files by label_table.compute_scores, overlapping intervals merged, and written into the label
+# table; labels/squats_aqa.json is re-exported from it for the older scripts
 
-with open(labels_path_knee_out, 'r') as f1:
-    data_knee_out = json.load(f1)
+def main():
+    table = update_scores()
+    scores = export_scores(table, SQUAT, os.path.join(LABELS_DIR, "squats_aqa.json"))
+    print(f"{len(scores)} squat scores")
 
-with open(video_durations, 'r') as d:
-    durations = json.load(d)
-
-scores = {}
-
-for id, errors in data_knee_in.items():
-    if errors == []:
-        scores[id] = 5
-    else:
-        for e in errors:
-            err_dur = e[1] - e[0]
-            dur = durations[id]
-            score = ((dur - err_dur) * 5) / dur
-            scores[id] = round(score, 2)
-
-
-for id, errors in data_knee_out.items():
-    if errors == []:
-        scores[id] += 5
-    else:
-        for e in errors:
-            err_dur = e[1] - e[0]
-            dur = durations[id]
-            score = ((dur - err_dur) * 5) / dur
-            scores[id] += round(score, 2)
-
-out_path = "labels/squats_aqa.json"
-with open(out_path, 'w') as d:
-    json.dump(scores, d, indent=4)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
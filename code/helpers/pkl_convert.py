@@ -1,12 +1,23 @@
-import cv2
 import numpy as np
 import os
-import json
 from tester import *
 import pickle
-
-def convert_video_to_pkl(video_file, output_folder, num_frames=128, resize_shape=(64, 64)):
-    cap = cv2.VideoCapture(video_file)
+import sys
+from functools import partial
+from convert_engine import run_conversion, split_ids
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from video_decode import open_video, decode_plan
+from atomic_file import atomic_write
+from artifact_cache import ArtifactCache
+
+def convert_video_to_pkl(video_file, output_folder, num_frames=128, resize_shape=(64, 64), frame_plan=None):
+    # frame_plan as in convert_npy.convert_video_to_npy, by default the first num_frames frames.
+    # frames the video does not have are zero padded. opencv can only decode at full resolution,
+    # the resize happens per kept frame right after decoding
+    cap, length = open_video(video_file)
+    if cap is None:
+        return 0, []
 
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
@@ -14,40 +25,41 @@ def convert_video_to_pkl(video_file, output_folder, num_frames=128, resize_shape
     filename = os.path.basename(video_file)
     filename_without_extension = os.path.splitext(filename)[0]
 
-    frames = []
-    frame_count = 0
-    while cap.isOpened() and frame_count < num_frames:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame = cv2.resize(frame, resize_shape)
-        frames.append(frame)
-        frame_count += 1
+    if frame_plan is None:
+        plan = np.arange(num_frames)
+    elif callable(frame_plan):
+        plan = np.asarray(frame_plan(length))
+    else:
+        plan = np.asarray(frame_plan)
+    plan = np.where(plan < length, plan, -1)
 
-    # Pad frames if less than num_frames
-    while len(frames) < num_frames:
-        frames.append(np.zeros_like(frames[0]))
+    try:
+        frames_array, decoded = decode_plan(cap, plan, resize_shape)
+    finally:
+        cap.release()
 
-    frames_array = np.array(frames)
+    frame_count = int(np.count_nonzero(plan[:decoded] >= 0))
+    if frame_count == 0:
+        return 0, []
 
     # Save as pickle
-    with open(os.path.join(output_folder, f"{filename_without_extension}.pkl"), 'wb') as f:
-        pickle.dump(frames_array, f)
-
-    cap.release()
+    output = f"{filename_without_extension}.pkl"
+    atomic_write(os.path.join(output_folder, output), lambda f: pickle.dump(frames_array, f))
 
-def make_npy(vids_path, out_folder_path, labels_path):
-    with open(labels_path, 'r') as f:
-        labels = json.load(f)
+    return frame_count, [output]
 
-    for video_id, _ in labels.items():
+def make_npy(vids_path, out_folder_path, labels_path, frame_plan=None, resize_shape=(64, 64), cache=None):
+    # vids_path is the shared allVids folder, the split only decides which ids are converted
+    jobs = []
+    for video_id in split_ids(labels_path):
         video_path = os.path.join(vids_path, f"{video_id}.mp4")
-        convert_video_to_pkl(video_path, out_folder_path)
+        jobs.append((video_id, (video_path, out_folder_path)))
+
+    run_conversion(partial(convert_video_to_pkl, frame_plan=frame_plan, resize_shape=resize_shape), jobs, out_folder_path, cache=cache)
 
 def main():
-    train_vids = "../../dissData/train_vids"
-    test_vids = "../../dissData/test_vids"
-    valid_vids = "../../dissData/valid_vids"
+    all_vids = "../../dissData/allVids"
+    cache = ArtifactCache("../../dissData/artifacts", budget_bytes=200 * 1024 ** 3)
 
     test_out_folder = "./test"
     train_out_folder = "./train"
@@ -57,9 +69,9 @@ def main():
     test_labels_path = "./labels/test_labels/test_data.json"
     valid_labels_path = "./labels/valid_labels/valid_data.json"
 
-    make_npy(train_vids, train_out_folder, train_labels_path)
-    make_npy(test_vids, test_out_folder, test_labels_path)
-    make_npy(valid_vids, valid_out_folder, valid_labels_path)
+    make_npy(all_vids, train_out_folder, train_labels_path, cache=cache)
+    make_npy(all_vids, test_out_folder, test_labels_path, cache=cache)
+    make_npy(all_vids, valid_out_folder, valid_labels_path, cache=cache)
 
     fuck(valid_out_folder, test_out_folder, train_out_folder)
 
@@ -2,21 +2,67 @@ import os
 import shutil
 import json
 
+# a split folder only needs the split's videos to show up under its own name, so they are
+# hardlinked out of allVids (no extra disk, no copying). across filesystems it falls back to
+# symlinks and only then to a real copy. the converters and dataloader_stream can also just be
+# pointed at allVids with the split's ids, which needs no folder at all
+
+def link_video(source_path, destination_path):
+    if os.path.lexists(destination_path):
+        if os.path.exists(destination_path) and os.path.samefile(source_path, destination_path):
+            return "existing"
+        os.remove(destination_path)
+
+    try:
+        os.link(source_path, destination_path)
+        return "hardlink"
+    except OSError:
+        pass
+
+    try:
+        os.symlink(os.path.abspath(source_path), destination_path)
+        return "symlink"
+    except OSError:
+        pass
+
+    shutil.copyfile(source_path, destination_path)
+    return "copy"
+
 def copy_videos(source_folder, destination_folder, data):
     if not os.path.exists(destination_folder):
         os.makedirs(destination_folder)
 
+    counts = {}
     for video_id in data.keys():
         source_path = os.path.join(source_folder, f"{video_id}.mp4")
         destination_path = os.path.join(destination_folder, f"{video_id}.mp4")
 
-        shutil.copyfile(source_path, destination_path)
+        how = link_video(source_path, destination_path)
+        counts[how] = counts.get(how, 0) + 1
+
+    # videos left over from an earlier split would otherwise stay in this one
+    wanted = set(f"{video_id}.mp4" for video_id in data.keys())
+    for file in os.listdir(destination_folder):
+        if file.endswith(".mp4") and file not in wanted:
+            os.remove(os.path.join(destination_folder, file))
+            counts["removed"] = counts.get("removed", 0) + 1
+
+    print(f"{destination_folder}: {counts}")
+
+def main():
+    source_videos_folder = '../../dissData/allVids'
+
+    splits = {
+        '../../dissData/train_labels/train_data.json': '../../dissData/train_vids',
+        '../../dissData/valid_labels/valid_data.json': '../../dissData/valid_vids',
+        '../../dissData/test_labels/test_data.json': '../../dissData/test_vids',
+    }
 
-train_json_path = '../../dissData/valid_labels/valid_data.json'
-with open(train_json_path, 'r') as f:
-    train_data = json.load(f)
+    for split_json_path, destination_folder in splits.items():
+        with open(split_json_path, 'r') as f:
+            split_data = json.load(f)
 
-source_videos_folder = '../../dissData/allVids'
-destination_folder = '../../dissData/valid_vids'
+        copy_videos(source_videos_folder, destination_folder, split_data)
 
-copy_videos(source_videos_folder, destination_folder, train_data)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+import os
+import json
+import hashlib
+import pickle
+import numpy as np
+from atomic_file import atomic_write, atomic_json
+
+# every label the trainers need, one row per video id, stored column by column in a single .npz:
+#   exercise   0 overhead press, 1 squat
+#   score      AQA score, built from the error intervals by compute_scores (score_union: one
+#              10 point scale over the union of every error kind)
+#   duration   video length in seconds
+#   split_*    0 train, 1 valid, 2 test, -1 not in the split scheme. split_stable is not read from
+#              files but assigned by assign_splits and carried over when the table is rebuilt
+#   interval_* error intervals (seconds) flattened, interval_video is the row they belong to
+#   interval_files  bit k set when the video is listed in INTERVAL_FILES[k] (even with no errors)
+# datasets get a LabelView, which behaves like the old label dicts for one task and split
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+LABELS_DIR = os.path.join(DATA_DIR, "labels")
+OHP_LABELS_DIR = os.path.join(DATA_DIR, "OHP", "Labeled_Dataset", "Labels")
+SQUAT_LABELS_DIR = os.path.join(DATA_DIR, "Squat", "Labeled_Dataset", "Labels")
+LABEL_TABLE = os.path.join(LABELS_DIR, "label_table.npz")
+
+OHP, SQUAT = 0, 1
+SPLITS = {"train": 0, "valid": 1, "test": 2}
+SPLIT_RATIOS = {"train": 0.7, "valid": 0.2, "test": 0.1}
+SCORE_BIN_EDGES = [2, 4, 6, 8]
+STABLE_SCHEME = "stable"
+
+# interval kinds
+OHP_KNEES, SQUAT_KNEES_INWARD, SQUAT_KNEES_FORWARD = 0, 1, 2
+INTERVAL_FILES = {
+    OHP_KNEES: os.path.join(OHP_LABELS_DIR, "error_knees.json"),
+    SQUAT_KNEES_INWARD: os.path.join(SQUAT_LABELS_DIR, "error_knees_inward.json"),
+    SQUAT_KNEES_FORWARD: os.path.join(SQUAT_LABELS_DIR, "error_knees_forward.json"),
+}
+NUM_KINDS = len(INTERVAL_FILES)
+
+# points each interval kind is worth: a video loses them in proportion to the time it spends in
+# that error, and its score is the sum over its exercise's kinds
+SCORE_POINTS = {
+    OHP: {OHP_KNEES: 10},
+    SQUAT: {SQUAT_KNEES_INWARD: 5, SQUAT_KNEES_FORWARD: 5},
+}
+MAX_SCORE = 10
+
+# which files define each split scheme
+SPLIT_FILES = {
+    "classification": {split: os.path.join(LABELS_DIR, "classification_labels", f"class_labels_{split}.pkl") for split in SPLITS},
+    "aqa": {split: [os.path.join(LABELS_DIR, "ohp_aqa_labels", f"ohp_aqa_{split}.pkl"),
+                    os.path.join(LABELS_DIR, "squat_aqa_labels", f"squats_aqa_{split}.pkl")] for split in SPLITS},
+    "ete": {
+        "train": os.path.join(LABELS_DIR, "train_labels", "train_data.json"),
+        "valid": os.path.join(LABELS_DIR, "valid_labels", "valid_data.json"),
+        "test": os.path.join(LABELS_DIR, "test_labels", "test_data.json"),
+    },
+}
+
+# task -> (rows it covers, split scheme it uses by default)
+TASKS = {
+    "classification": (None, "classification"),
+    "ohp_aqa": (OHP, "aqa"),
+    "squat_aqa": (SQUAT, "aqa"),
+    "ete": (None, "ete"),
+}
+
+
+def load_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_ids(path):
+    if path.endswith(".json"):
+        return list(load_json(path).keys())
+    with open(path, 'rb') as f:
+        return list(pickle.load(f).keys())
+
+
+def load_intervals(row_of, interval_files=INTERVAL_FILES):
+    interval_video, interval_kind, interval_start, interval_end = [], [], [], []
+    labelled = np.zeros(len(row_of), dtype=np.int8)
+    for kind, path in interval_files.items():
+        for video_id, intervals in load_json(path).items():
+            if video_id not in row_of:
+                continue
+            labelled[row_of[video_id]] |= 1 << kind
+            for start, end in intervals:
+                interval_video.append(row_of[video_id])
+                interval_kind.append(kind)
+                interval_start.append(start)
+                interval_end.append(end)
+
+    return {
+        "interval_video": np.array(interval_video, dtype=np.int32),
+        "interval_kind": np.array(interval_kind, dtype=np.int8),
+        "interval_start": np.array(interval_start, dtype=np.float32),
+        "interval_end": np.array(interval_end, dtype=np.float32),
+        "interval_files": labelled,
+    }
+
+
+def merge_intervals(group, start, end):
+    # union of the intervals inside each group, groups given as non-negative ints.
+    # returns (group, start, end) of the merged runs, sorted by group then start
+    if len(group) == 0:
+        return group, start, end
+
+    order = np.lexsort((start, group))
+    group, start, end = group[order], start[order], end[order]
+
+    # running max of end within each group: offsetting every group past the previous ones
+    # lets one maximum.accumulate over the whole array stand in for a per group loop
+    span = float(end.max() - start.min()) + 1
+    reach = np.maximum.accumulate(end + group * span) - group * span
+
+    new_run = np.ones(len(group), dtype=bool)
+    new_run[1:] = (group[1:] != group[:-1]) | (start[1:] > reach[:-1])
+    firsts = np.flatnonzero(new_run)
+    return group[firsts], start[firsts], np.maximum.reduceat(end, firsts)
+
+
+def error_time(num_videos, video, kind, start, end, duration, kinds=None):
+    # seconds each video spends in an error, overlaps counted once. kinds=None unions every kind
+    # into one column, otherwise returns (num_videos, len(kinds)) with one column per kind
+    start = np.clip(start, 0, duration[video])
+    end = np.clip(end, 0, duration[video])
+
+    if kinds is None:
+        group, merged_start, merged_end = merge_intervals(video.astype(np.int64), start, end)
+        return np.bincount(group, weights=merged_end - merged_start, minlength=num_videos)
+
+    group, merged_start, merged_end = merge_intervals(video.astype(np.int64) * NUM_KINDS + kind, start, end)
+    per_kind = np.bincount(group, weights=merged_end - merged_start, minlength=num_videos * NUM_KINDS)
+    return per_kind.reshape(num_videos, NUM_KINDS)[:, kinds]
+
+
+def compute_scores(columns):
+    # every AQA score column from the interval and duration columns in one pass.
+    # videos missing a duration or an interval file their exercise needs get nan
+    num_videos = len(columns["ids"])
+    duration = columns["duration"].astype(np.float64)
+    video, kind = columns["interval_video"], columns["interval_kind"]
+    start, end = columns["interval_start"].astype(np.float64), columns["interval_end"].astype(np.float64)
+
+    kinds = list(range(NUM_KINDS))
+    clean = 1 - error_time(num_videos, video, kind, start, end, duration, kinds) / duration[:, None]
+    union_clean = 1 - error_time(num_videos, video, kind, start, end, duration) / duration
+
+    score = np.full(num_videos, np.nan)
+    score_union = np.full(num_videos, np.nan)
+    for exercise, points in SCORE_POINTS.items():
+        needed = sum(1 << kind for kind in points)
+        rows = (columns["exercise"] == exercise) & ((columns["interval_files"] & needed) == needed)
+        score[rows] = sum(clean[rows, kind] * value for kind, value in points.items())
+        score_union[rows] = union_clean[rows] * MAX_SCORE
+
+    return {
+        "score": np.round(score, 2).astype(np.float32),
+        "score_union": np.round(score_union, 2).astype(np.float32),
+    }
+
+
+def hash_unit(video_id):
+    # fixed point in [0, 1) per video id, the same on every machine and every run
+    digest = hashlib.blake2b(video_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2 ** 64
+
+
+def split_strata(exercise, score):
+    # exercise x score bin, unscored videos in a bin of their own
+    score_bin = np.where(np.isnan(score), len(SCORE_BIN_EDGES) + 1, np.digitize(np.nan_to_num(score), SCORE_BIN_EDGES))
+    return exercise.astype(np.int64) * (len(SCORE_BIN_EDGES) + 2) + score_bin
+
+
+def assign_splits(ids, strata, split=None, ratios=SPLIT_RATIOS):
+    # rows that already have a split (>= 0) keep it, so placing new videos never moves old ones.
+    # the new rows of each stratum are visited in order of their id hash and each goes to the
+    # split furthest below its share of that stratum, counting the rows already placed
+    split = np.full(len(ids), -1, dtype=np.int8) if split is None else split.astype(np.int8).copy()
+    keys = np.array([hash_unit(video_id) for video_id in ids], dtype=np.float64)
+    shares = np.array([ratios[name] for name in sorted(SPLITS, key=SPLITS.get)], dtype=np.float64)
+    shares /= shares.sum()
+
+    for stratum in np.unique(strata):
+        rows = np.flatnonzero(strata == stratum)
+        assigned = split[rows]
+        counts = np.bincount(assigned[assigned >= 0], minlength=len(SPLITS)).astype(np.float64)
+
+        for row in rows[np.argsort(keys[rows], kind="stable")]:
+            if split[row] >= 0:
+                continue
+            choice = int(np.argmax(shares * (counts.sum() + 1) - counts))
+            split[row] = choice
+            counts[choice] += 1
+
+    return split
+
+
+def previous_splits(path, ids, scheme=STABLE_SCHEME):
+    # the scheme's column of an earlier table at path, realigned to ids (-1 for new videos)
+    split = np.full(len(ids), -1, dtype=np.int8)
+    if not os.path.exists(path):
+        return split
+
+    previous = LabelTable(path)
+    if "split_" + scheme not in previous.columns:
+        return split
+
+    rows = np.array([previous.row_of.get(video_id, -1) for video_id in ids], dtype=np.int64)
+    known = rows >= 0
+    split[known] = previous["split_" + scheme][rows[known]]
+    return split
+
+
+def build_label_table(out_path=LABEL_TABLE):
+    exercises = load_json(os.path.join(LABELS_DIR, "classification_labels.json"))
+    durations = load_json(os.path.join(LABELS_DIR, "video_durations.json"))
+
+    ids = sorted(exercises.keys())
+    row_of = {video_id: row for row, video_id in enumerate(ids)}
+
+    columns = {
+        "ids": np.array(ids),
+        "exercise": np.array([exercises[video_id] for video_id in ids], dtype=np.int8),
+        "duration": np.array([durations.get(video_id, np.nan) for video_id in ids], dtype=np.float32),
+    }
+
+    for scheme, files in SPLIT_FILES.items():
+        split = np.full(len(ids), -1, dtype=np.int8)
+        for split_name, paths in files.items():
+            for path in (paths if isinstance(paths, list) else [paths]):
+                rows = [row_of[video_id] for video_id in load_ids(path) if video_id in row_of]
+                split[rows] = SPLITS[split_name]
+        columns["split_" + scheme] = split
+
+    columns.update(load_intervals(row_of))
+    columns.update(compute_scores(columns))
+
+    carried = previous_splits(out_path, ids)
+    strata = split_strata(columns["exercise"], columns["score"])
+    columns["split_" + STABLE_SCHEME] = assign_splits(ids, strata, carried)
+
+    save_columns(columns, out_path)
+    print(f"{(carried < 0).sum()} videos newly assigned to a stable split")
+    print(f"wrote {len(ids)} videos and {len(columns['interval_video'])} error intervals to {out_path}")
+
+
+def update_scores(path=LABEL_TABLE):
+    # re-reads the interval files and durations and rewrites the score columns in place,
+    # leaving ids and splits alone
+    table = LabelTable(path)
+    columns = table.columns
+    durations = load_json(os.path.join(LABELS_DIR, "video_durations.json"))
+
+    columns["duration"] = np.array([durations.get(video_id, np.nan) for video_id in table.ids.tolist()], dtype=np.float32)
+    columns.update(load_intervals(table.row_of))
+    columns.update(compute_scores(columns))
+
+    save_columns(columns, path)
+    scored = np.isfinite(columns["score"])
+    print(f"scored {scored.sum()} videos from {len(columns['interval_video'])} error intervals in {path}")
+    return table
+
+
+def export_scores(table, exercise, out_path, column="score", decimals=2):
+    # {video id: score} json for one exercise, the format labels/OHP_Aqa.json (1 decimal) and
+    # squats_aqa.json (2 decimals) use, whole scores written as ints like the old label makers did
+    rows = np.flatnonzero((table["exercise"] == exercise) & np.isfinite(table[column]))
+    values = table[column][rows].astype(np.float64).round(decimals).tolist()
+    scores = {video_id: int(value) if value.is_integer() else value
+              for video_id, value in zip(table.ids[rows].tolist(), values)}
+
+    atomic_json(out_path, scores, indent=4)
+    return scores
+
+
+def save_columns(columns, out_path):
+    atomic_write(out_path, lambda f: np.savez(f, **columns))
+
+
+class LabelTable:
+    def __init__(self, path=LABEL_TABLE):
+        self.path = path
+
+        with np.load(path) as data:
+            self.columns = {name: data[name] for name in data.files}
+
+        self.ids = self.columns["ids"]
+        self.row_of = {video_id: row for row, video_id in enumerate(self.ids.tolist())}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def view(self, task, split=None, scheme=None):
+        exercise, default_scheme = TASKS[task]
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        if exercise is not None:
+            mask &= self.columns["exercise"] == exercise
+        if split is not None:
+            mask &= self.columns["split_" + (scheme or default_scheme)] == SPLITS[split]
+
+        return LabelView(self, task, mask)
+
+    def intervals(self, video_id, kind=None):
+        rows = self.columns["interval_video"] == self.row_of[video_id]
+        if kind is not None:
+            rows &= self.columns["interval_kind"] == kind
+        return np.stack([self.columns["interval_start"][rows], self.columns["interval_end"][rows]], axis=1)
+
+
+class LabelView:
+    # read-only dict look-alike: keys() / [] / len / in, like the label pickles it replaces
+    def __init__(self, table, task, mask):
+        self.table = table
+        self.task = task
+        self.mask = mask
+        self.rows = np.flatnonzero(mask)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, video_id):
+        row = self.table.row_of.get(video_id)
+        return row is not None and bool(self.mask[row])
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return self.table.ids[self.rows].tolist()
+
+    def items(self):
+        return [(video_id, self[video_id]) for video_id in self.keys()]
+
+    def __getitem__(self, video_id):
+        row = self.table.row_of[video_id]
+        if not self.mask[row]:
+            raise KeyError(video_id)
+
+        exercise = int(self.table.columns["exercise"][row])
+        score = float(self.table.columns["score"][row])
+
+        if self.task == "classification":
+            return exercise
+        if self.task == "ete":
+            return [exercise, score]
+        return score
+
+
+def main():
+    build_label_table()
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,47 @@
+import os
+import sys
 import pickle
 import json
-import random
+import numpy as np
 
-def split_data(data_path, train_ratio=0.7, val_ratio=0.2, test_ratio=0.1):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from label_table import SPLITS, SQUAT, assign_splits, split_strata
+
+def previous_split(ids, pkl_files):
+    # the split each id already has in the pkl files written last time (-1 if none)
+    split = np.full(len(ids), -1, dtype=np.int8)
+    row_of = {video_id: row for row, video_id in enumerate(ids)}
+    for split_name, pkl_file in pkl_files.items():
+        if not os.path.exists(pkl_file):
+            continue
+        with open(pkl_file, 'rb') as f:
+            rows = [row_of[video_id] for video_id in pickle.load(f) if video_id in row_of]
+        split[rows] = SPLITS[split_name]
+    return split
+
+
+def split_data(data_path, pkl_files, train_ratio=0.7, val_ratio=0.2, test_ratio=0.1):
     #assert train_ratio + val_ratio + test_ratio == 1.0, "The sum of the ratios must be 1."
     with open(data_path, 'r') as f:
         data = json.load(f)
-    
-    data_items = list(data.items())
-    random.shuffle(data_items)  
 
-    total_size = len(data_items)
-    train_size = int(total_size * train_ratio)
-    val_size = int(total_size * val_ratio)
+    # videos already in the pkl files keep their split; new ones are placed per score bin in
+    # order of a hash of their id (label_table.assign_splits), so every run gives the same split
+    ids = list(data.keys())
+    scores = np.array([data[video_id] for video_id in ids], dtype=np.float64)
+    strata = split_strata(np.full(len(ids), SQUAT), scores)
+    split = assign_splits(ids, strata, previous_split(ids, pkl_files),
+                          ratios={"train": train_ratio, "valid": val_ratio, "test": test_ratio})
 
-    train_data = dict(data_items[:train_size])
-    val_data = dict(data_items[train_size:train_size + val_size])
-    test_data = dict(data_items[train_size + val_size:])
+    train_data = {video_id: data[video_id] for video_id, s in zip(ids, split) if s == SPLITS["train"]}
+    val_data = {video_id: data[video_id] for video_id, s in zip(ids, split) if s == SPLITS["valid"]}
+    test_data = {video_id: data[video_id] for video_id, s in zip(ids, split) if s == SPLITS["test"]}
 
     return train_data, val_data, test_data
 
 
 def convert_json_to_pkl(data, pkl_file_train, pkl_file_test, pkl_file_valid):
-    train, test, valid = split_data(data)
+    train, valid, test = split_data(data, {"train": pkl_file_train, "valid": pkl_file_valid, "test": pkl_file_test})
         
     with open(pkl_file_train, 'wb') as f:
         pickle.dump(train, f)
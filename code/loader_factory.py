@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import socket
+import itertools
+import torch
+from torch.utils.data import DataLoader, IterableDataset
+from atomic_file import atomic_json
+
+# DataLoader settings picked by timing a few batches per candidate the first time a
+# (machine, dataset, batch size) combination is seen; the winner is cached on disk
+
+CONFIG_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "loader_configs.json")
+BENCH_BATCHES = 8
+
+
+def first_sample(dataset):
+    if isinstance(dataset, IterableDataset):
+        return next(iter(dataset))
+    return dataset[0]
+
+
+def shuffle_arg(dataset, shuffle):
+    # iterable datasets (dataloader_stream) shuffle themselves
+    return None if isinstance(dataset, IterableDataset) else shuffle
+
+
+def config_key(dataset, batch_size):
+    sample = first_sample(dataset)[0]
+    return "|".join([
+        socket.gethostname(),
+        str(os.cpu_count()),
+        str(torch.cuda.is_available()),
+        type(dataset).__module__,
+        str(batch_size),
+        "x".join(str(d) for d in sample.shape),
+        str(sample.dtype),
+    ])
+
+
+def load_configs():
+    if not os.path.exists(CONFIG_CACHE):
+        return {}
+    with open(CONFIG_CACHE, 'r') as f:
+        return json.load(f)
+
+
+def save_config(key, config):
+    configs = load_configs()
+    configs[key] = config
+
+    atomic_json(CONFIG_CACHE, configs, indent=4)
+
+
+def candidate_configs():
+    cpus = os.cpu_count() or 1
+    workers = sorted(set([0] + [w for w in (2, 4, 8, 16) if w <= cpus] + [cpus]))
+    pin = [True, False] if torch.cuda.is_available() else [False]
+
+    for num_workers, pin_memory in itertools.product(workers, pin):
+        if num_workers == 0:
+            yield {"num_workers": 0, "prefetch_factor": None, "pin_memory": pin_memory, "persistent_workers": False}
+            continue
+        for prefetch_factor in (2, 4):
+            yield {"num_workers": num_workers, "prefetch_factor": prefetch_factor, "pin_memory": pin_memory, "persistent_workers": True}
+
+
+def time_config(dataset, batch_size, config):
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=shuffle_arg(dataset, True), **loader_kwargs(config))
+    batches = iter(loader)
+
+    # the first batch pays for starting the workers, which persistent workers only do once
+    next(batches)
+    start = time.time()
+    count = 0
+    for batch in itertools.islice(batches, BENCH_BATCHES):
+        if config["pin_memory"]:
+            batch[0].to("cuda", non_blocking=True)
+        count += 1
+    elapsed = time.time() - start
+
+    del batches
+    return elapsed / max(count, 1)
+
+
+def tune(dataset, batch_size):
+    best, best_time = None, float("inf")
+    for config in candidate_configs():
+        try:
+            batch_time = time_config(dataset, batch_size, config)
+        except (RuntimeError, OSError) as e:
+            print(f"loader config {config} failed: {e}")
+            continue
+
+        print(f"loader config {config}: {batch_time:.4f}s per batch")
+        if batch_time < best_time:
+            best, best_time = config, batch_time
+
+    return best
+
+
+def loader_kwargs(config):
+    kwargs = {"num_workers": config["num_workers"], "pin_memory": config["pin_memory"]}
+    if config["num_workers"] > 0:
+        kwargs["prefetch_factor"] = config["prefetch_factor"]
+        kwargs["persistent_workers"] = config["persistent_workers"]
+    return kwargs
+
+
+def make_loader(dataset, batch_size, shuffle=False, autotune=True, **overrides):
+    config = {"num_workers": 0, "prefetch_factor": None, "pin_memory": False, "persistent_workers": False}
+
+    if autotune and len(dataset) > 0:
+        key = config_key(dataset, batch_size)
+        configs = load_configs()
+        if key in configs:
+            config = configs[key]
+        else:
+            print(f"tuning DataLoader for {key}")
+            config = tune(dataset, batch_size) or config
+            save_config(key, config)
+
+    config.update(overrides)
+    print(f"DataLoader config: {config}")
+
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle_arg(dataset, shuffle), **loader_kwargs(config))
@@ -0,0 +1,147 @@
+import io
+import os
+import json
+import zlib
+import pickle
+import numpy as np
+from multiprocessing import Pool
+from label_table import LabelTable
+from atomic_file import atomic_json
+
+# one scan of a clip directory (.npy from helpers/convert_npy.py, .pkl from helpers/pkl_convert.py)
+# written to <root_dir>/manifest.json:
+#   {"clips": {clip_id: {shape, dtype, frames, bytes, mtime, checksum, status}},
+#    "missing": [labelled ids with no clip], "unlabeled": [clips with no label]}
+# status is "ok", "corrupt" (unreadable or not a TxHxWxC array), "empty" (no frames) or "all_zero".
+# datasets read shapes from here instead of probing every file and drop anything not "ok"
+
+MANIFEST_NAME = "manifest.json"
+CLIP_EXTENSIONS = (".npy", ".pkl")
+
+
+def manifest_path(root_dir):
+    return os.path.join(root_dir, MANIFEST_NAME)
+
+
+def scan_clip(path):
+    stat = os.stat(path)
+    entry = {"bytes": stat.st_size, "mtime": stat.st_mtime, "shape": None, "dtype": None, "frames": 0}
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    entry["checksum"] = f"{zlib.crc32(data):08x}"
+
+    try:
+        if path.endswith(".npy"):
+            clip = np.load(io.BytesIO(data))
+        else:
+            clip = np.asarray(pickle.loads(data))
+    except Exception:
+        entry["status"] = "corrupt"
+        return path, entry
+
+    entry["shape"] = list(clip.shape)
+    entry["dtype"] = str(clip.dtype)
+    entry["frames"] = int(clip.shape[0]) if clip.ndim else 0
+
+    if clip.ndim != 4:
+        entry["status"] = "corrupt"
+    elif clip.shape[0] == 0:
+        entry["status"] = "empty"
+    elif not clip.any():
+        entry["status"] = "all_zero"
+    else:
+        entry["status"] = "ok"
+
+    return path, entry
+
+
+def build_manifest(root_dir, label_ids=None, processes=None):
+    files = {}
+    for file in sorted(os.listdir(root_dir)):
+        clip_id, ext = os.path.splitext(file)
+        if ext in CLIP_EXTENSIONS:
+            files[clip_id] = os.path.join(root_dir, file)
+
+    # files that have not changed since the last scan keep their entry
+    old = load_manifest(root_dir)
+    clips = {}
+    to_scan = []
+    for clip_id, path in files.items():
+        stat = os.stat(path)
+        entry = old.clips.get(clip_id) if old is not None else None
+        if entry is not None and entry["bytes"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            clips[clip_id] = entry
+        else:
+            to_scan.append(path)
+
+    with Pool(processes) as pool:
+        for path, entry in pool.imap_unordered(scan_clip, to_scan, chunksize=8):
+            clips[os.path.splitext(os.path.basename(path))[0]] = entry
+
+    manifest = {"clips": {clip_id: clips[clip_id] for clip_id in sorted(clips)}, "missing": [], "unlabeled": []}
+    if label_ids is not None:
+        label_ids = set(label_ids)
+        manifest["missing"] = sorted(label_ids - set(clips))
+        manifest["unlabeled"] = sorted(set(clips) - label_ids)
+
+    atomic_json(manifest_path(root_dir), manifest)
+
+    Manifest(manifest).report(root_dir, scanned=len(to_scan))
+
+
+class Manifest:
+    def __init__(self, manifest):
+        self.clips = manifest["clips"]
+        self.missing = manifest["missing"]
+        self.unlabeled = manifest["unlabeled"]
+
+    def __contains__(self, clip_id):
+        return clip_id in self.clips
+
+    def ok(self, clip_id):
+        entry = self.clips.get(clip_id)
+        return entry is not None and entry["status"] == "ok"
+
+    def shape(self, clip_id):
+        return tuple(self.clips[clip_id]["shape"])
+
+    def usable(self, clip_ids):
+        # keeps the ids whose clip is there and healthy, saying how many were dropped
+        kept = [clip_id for clip_id in clip_ids if self.ok(clip_id)]
+        if len(kept) < len(clip_ids):
+            print(f"manifest: dropping {len(clip_ids) - len(kept)} of {len(clip_ids)} clips (missing or bad)")
+        return kept
+
+    def report(self, root_dir, scanned=None):
+        counts = {}
+        for entry in self.clips.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+
+        print(f"{root_dir}: {len(self.clips)} clips {counts}" + (f", {scanned} scanned" if scanned is not None else ""))
+        print(f"  {len(self.missing)} labelled ids without a clip, {len(self.unlabeled)} clips without a label")
+        for clip_id, entry in self.clips.items():
+            if entry["status"] != "ok":
+                print(f"  {entry['status']}: {clip_id} {entry['shape']}")
+
+
+def load_manifest(root_dir):
+    path = manifest_path(root_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return Manifest(json.load(f))
+
+
+def main():
+    video_npy = "../../dissData/video_npy"
+    video_npy_reduced = "../../dissData/video_npy_reduced"
+    labels = LabelTable()
+
+    for split in ["train", "valid", "test"]:
+        build_manifest(os.path.join(video_npy, split), labels.view("ete", split).keys())
+
+    build_manifest(os.path.join(video_npy_reduced, "allVids"), labels.ids.tolist())
+
+if __name__ == "__main__":
+    main()
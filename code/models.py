@@ -102,35 +102,47 @@ class C3DExtended(nn.Module):
         self.batch_norm2 = nn.BatchNorm2d(8)
         self.batch_norm3 = nn.BatchNorm2d(4)
 
+    def frame_norm(self, norm, h):
+        # the BatchNorm2d layers normalise over frames: an unbatched (C, T, H, W) clip reads as
+        # C images of T channels. in training the statistics (and running stat updates) are each
+        # clip's own, so clips are normalised one at a time; in eval every clip uses the same
+        # running stats and the batch is folded to (N * C, T, H, W) in one call
+        if h.dim() == 4:
+            return norm(h)
+        if self.training:
+            return torch.stack([norm(clip) for clip in h])
+        n, c, t, height, width = h.shape
+        return norm(h.reshape(n * c, t, height, width)).reshape(n, c, t, height, width)
+
     def forward(self, x):
         h = self.relu(self.pre_conv(x))
-        h = self.batch_norm1(x)
+        h = self.frame_norm(self.batch_norm1, x)
         h = self.pre_pool(h)
 
         h = self.relu(self.conv1(h))
-        h = self.batch_norm1(h)
+        h = self.frame_norm(self.batch_norm1, h)
         h = self.pool1(h)
 
         h = self.relu(self.conv2(h))
-        h = self.batch_norm1(h)
+        h = self.frame_norm(self.batch_norm1, h)
         h = self.pool2(h)
 
         h = self.relu(self.conv3a(h))
-        h = self.batch_norm2(h)
+        h = self.frame_norm(self.batch_norm2, h)
         h = self.relu(self.conv3b(h))
-        h = self.batch_norm2(h)
+        h = self.frame_norm(self.batch_norm2, h)
         h = self.pool3(h)
 
         h = self.relu(self.conv4a(h))
-        h = self.batch_norm3(h)
+        h = self.frame_norm(self.batch_norm3, h)
         h = self.relu(self.conv4b(h))
-        h = self.batch_norm3(h)
+        h = self.frame_norm(self.batch_norm3, h)
         h = self.pool4(h)
 
         h = self.relu(self.conv5a(h))
-        h = self.batch_norm3(h)
+        h = self.frame_norm(self.batch_norm3, h)
         h = self.relu(self.conv5b(h))
-        h = self.batch_norm3(h)
+        h = self.frame_norm(self.batch_norm3, h)
         h = self.pool5(h)
 
         h = h.reshape(h.size(0), -1)
@@ -230,34 +242,29 @@ class ETEModelFinal(nn.Module):
         self.fc_scorer = nn.Linear(4096, 1)
     
     def forward(self, x):
-        features = []
-        for frame in x:
-            feature_out = self.relu(self.pre_conv(frame))
-            c = self.pre_pool(feature_out)
-
-            c = self.relu(self.conv1(c))
-            c = self.pool1(c)
+        # the whole batch goes through the conv stack at once, (N, C, T, H, W) -> (N, features)
+        feature_out = self.relu(self.pre_conv(x))
+        c = self.pre_pool(feature_out)
 
-            c = self.relu(self.conv2(c))
-            c = self.pool2(c)
+        c = self.relu(self.conv1(c))
+        c = self.pool1(c)
 
-            c = self.relu(self.conv3a(c))
-            c = self.relu(self.conv3b(c))
-            c = self.pool3(c)
+        c = self.relu(self.conv2(c))
+        c = self.pool2(c)
 
-            c = self.relu(self.conv4a(c))
-            c = self.relu(self.conv4b(c))
-            c = self.pool4(c)
+        c = self.relu(self.conv3a(c))
+        c = self.relu(self.conv3b(c))
+        c = self.pool3(c)
 
-            c = self.relu(self.conv5a(c))
-            c = self.relu(self.conv5b(c))
-            c = self.pool5(c)
+        c = self.relu(self.conv4a(c))
+        c = self.relu(self.conv4b(c))
+        c = self.pool4(c)
 
-            c = c.reshape(c.size(0), -1)
-            features.append(c)
+        c = self.relu(self.conv5a(c))
+        c = self.relu(self.conv5b(c))
+        c = self.pool5(c)
 
-        features = torch.stack(features, dim=0)
-        features = features.flatten(start_dim=1, end_dim=2)
+        features = c.reshape(c.size(0), -1)
 
         features = self.fc1(features)
         c = self.fc_class(features)
@@ -279,13 +286,7 @@ class EndToEndModel(nn.Module):
     def forward(self, x):
         classification_output = self.classifier(x)
 
-        features = []
-        for frame in x:
-            feature_out = self.cnn(frame)
-            features.append(feature_out)
-
-        features = torch.stack(features, dim=0)
-        features = features.flatten(start_dim=1, end_dim=2)
+        features = self.cnn(x).reshape(x.size(0), -1)
 
         fc_out = self.fully_connected(features)
         final_score = self.final_score_regressor(fc_out)
@@ -304,13 +305,7 @@ class ETEC3D(nn.Module):
         self.scorer = scorer
     
     def forward(self, x):
-        features = []
-        for frame in x:
-            feature_out = self.cnn_layer(frame)
-            features.append(feature_out)
-
-        features = torch.stack(features, dim=0)
-        features = features.flatten(start_dim=1, end_dim=2)
+        features = self.cnn_layer(x).reshape(x.size(0), -1)
 
         fc_out = self.fully_connected(features)
         
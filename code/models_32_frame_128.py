@@ -261,13 +261,7 @@ class EndToEndModel(nn.Module):
     def forward(self, x):
         classification_output = self.classifier(x)
 
-        features = []
-        for frame in x:
-            feature_out = self.cnn(frame)
-            features.append(feature_out)
-
-        features = torch.stack(features, dim=0)
-        features = features.flatten(start_dim=1, end_dim=2)
+        features = self.cnn(x).reshape(x.size(0), -1)
 
         fc_out = self.fully_connected(features)
         final_score = self.final_score_regressor(fc_out)
@@ -286,13 +280,7 @@ class ETEC3D(nn.Module):
         self.scorer = scorer
     
     def forward(self, x):
-        features = []
-        for frame in x:
-            feature_out = self.cnn_layer(frame)
-            features.append(feature_out)
-
-        features = torch.stack(features, dim=0)
-        features = features.flatten(start_dim=1, end_dim=2)
+        features = self.cnn_layer(x).reshape(x.size(0), -1)
         fc_out = self.fully_connected(features)
         
         classification_output = self.classifier(fc_out)
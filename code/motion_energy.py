@@ -0,0 +1,123 @@
+import os
+import cv2
+import numpy as np
+from multiprocessing import Pool
+from clip_store import load_clip_file
+from temporal_sampler import ENERGY_POLICIES
+from atomic_file import atomic_write
+
+# how much each frame moves: frames are shrunk to ENERGY_SIZE grey thumbnails and energy[t] is
+# the mean absolute difference between thumbnails t - 1 and t (energy[0] copies energy[1]).
+# a directory of .mp4 videos or .npy / .pkl clips is scanned once into <dir>/motion_energy.npz
+#   ids, offsets, energy   video i's signal is energy[offsets[i]:offsets[i + 1]]
+# and the "topk" / "active" TemporalSampler policies use it to pick frames where the lift happens
+
+ENERGY_NAME = "motion_energy.npz"
+ENERGY_SIZE = (32, 32)
+ENERGY_EXTENSIONS = (".mp4", ".npy", ".pkl")
+
+
+def energy_path(root_dir):
+    return os.path.join(root_dir, ENERGY_NAME)
+
+
+def thumbnail(frame):
+    return cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), ENERGY_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def frame_energy(thumbnails):
+    if len(thumbnails) < 2:
+        return np.zeros(len(thumbnails), dtype=np.float32)
+
+    thumbnails = thumbnails.astype(np.float32)
+    diffs = np.abs(thumbnails[1:] - thumbnails[:-1]).mean(axis=(1, 2))
+    return np.concatenate([diffs[:1], diffs]).astype(np.float32)
+
+
+def video_energy(video_path):
+    cap = cv2.VideoCapture(video_path)
+    thumbnails = []
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        thumbnails.append(thumbnail(frame))
+    cap.release()
+
+    return frame_energy(np.array(thumbnails, dtype=np.uint8).reshape(-1, ENERGY_SIZE[1], ENERGY_SIZE[0]))
+
+
+def clip_energy(clip):
+    return frame_energy(np.array([thumbnail(np.ascontiguousarray(frame)) for frame in clip]).reshape(-1, ENERGY_SIZE[1], ENERGY_SIZE[0]))
+
+
+def file_energy(path):
+    cv2.setNumThreads(1)
+    if path.endswith(".mp4"):
+        return path, video_energy(path)
+    return path, clip_energy(load_clip_file(path))
+
+
+def build_energy_table(root_dir, processes=None):
+    files = sorted(file for file in os.listdir(root_dir) if os.path.splitext(file)[1] in ENERGY_EXTENSIONS)
+
+    with Pool(processes) as pool:
+        energies = dict(pool.imap_unordered(file_energy, [os.path.join(root_dir, file) for file in files], chunksize=4))
+
+    signals = [energies[os.path.join(root_dir, file)] for file in files]
+    columns = {
+        "ids": np.array([os.path.splitext(file)[0] for file in files]),
+        "offsets": np.concatenate([[0], np.cumsum([len(signal) for signal in signals])]).astype(np.int64),
+        "energy": np.concatenate(signals + [np.zeros(0, dtype=np.float32)]),
+    }
+
+    out_path = energy_path(root_dir)
+    atomic_write(out_path, lambda f: np.savez(f, **columns))
+    print(f"{root_dir}: motion energy of {len(files)} videos ({len(columns['energy'])} frames) -> {out_path}")
+
+
+class EnergyTable:
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.columns = {name: data[name] for name in data.files}
+        self.row_of = {video_id: row for row, video_id in enumerate(self.columns["ids"].tolist())}
+
+    def __contains__(self, video_id):
+        return video_id in self.row_of
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def energy(self, video_id):
+        row = self.row_of[video_id]
+        return self.columns["energy"][self.columns["offsets"][row]:self.columns["offsets"][row + 1]]
+
+    def energies(self, video_ids):
+        # aligned with video_ids, None where the video was not scanned
+        return [self.energy(video_id) if video_id in self.row_of else None for video_id in video_ids]
+
+
+def load_energy(root_dir):
+    path = energy_path(root_dir)
+    return EnergyTable(path) if os.path.exists(path) else None
+
+
+def dataset_energies(root_dir, video_ids, sampling, energy=None):
+    # what a dataset hands TemporalSampler.build: the signals from `energy`, or from
+    # <root_dir>/motion_energy.npz, when the sampling policy uses them
+    if sampling not in ENERGY_POLICIES:
+        return None
+    if energy is None and root_dir is not None:
+        energy = load_energy(root_dir)
+    if energy is None:
+        print(f"no motion energy for {root_dir}, {sampling} sampling falls back to uniform")
+        return None
+    return energy.energies(video_ids)
+
+
+def main():
+    build_energy_table("../../dissData/allVids")
+    build_energy_table("../../dissData/video_npy_reduced/allVids")
+
+if __name__ == "__main__":
+    main()
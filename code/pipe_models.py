@@ -68,33 +68,26 @@ class C3DAQA(nn.Module):
         self.relu = nn.ReLU()
     
     def forward(self, x):
-        features = []
-        
-        for frame in x:
-            h = self.relu(self.conv1(frame))
-            h = self.pool1(h)
+        # the whole batch goes through the conv stack at once, (N, C, T, H, W) -> (N, features)
+        h = self.relu(self.conv1(x))
+        h = self.pool1(h)
 
-            h = self.relu(self.conv2(h))
-            h = self.pool2(h)
+        h = self.relu(self.conv2(h))
+        h = self.pool2(h)
 
-            h = self.relu(self.conv3a(h))
-            h = self.relu(self.conv3b(h))
-            h = self.pool3(h)
+        h = self.relu(self.conv3a(h))
+        h = self.relu(self.conv3b(h))
+        h = self.pool3(h)
 
-            h = self.relu(self.conv4a(h))
-            h = self.relu(self.conv4b(h))
-            h = self.pool4(h)
+        h = self.relu(self.conv4a(h))
+        h = self.relu(self.conv4b(h))
+        h = self.pool4(h)
 
-            h = self.relu(self.conv5a(h))
-            h = self.relu(self.conv5b(h))
-            h = self.pool5(h)
+        h = self.relu(self.conv5a(h))
+        h = self.relu(self.conv5b(h))
+        h = self.pool5(h)
 
-            h = h.reshape(h.size(0), -1)
-
-            features.append(h)
-        
-        features = torch.stack(features, dim=0)
-        features = features.flatten(start_dim=1, end_dim=2)
+        features = h.reshape(h.size(0), -1)
 
         h = self.relu(self.fc1(features))
         h = self.relu(self.fc2(h))
@@ -2,6 +2,8 @@ import torch
 from pipe_models import BinaryClassifier, OverHeadPressAQA, BarbellSquatsAQA
 import cv2
 import numpy as np
+import os
+from roi_crop import crop_window, crop
 
 class Showcase:
     def __init__(self, video_path, classifier_path, ohp_aqa_model_path, squats_aqa_model_path, device):
@@ -11,13 +13,21 @@ class Showcase:
         self.squats_aqa_model_path = squats_aqa_model_path
         self.device = device
 
-    def video_to_frames(self, video_path, num_frames=32):
+    def video_to_frames(self, video_path, num_frames=32, roi=False):
         cap = cv2.VideoCapture(video_path)
+
+        # crop to the lifter first when the video has a bar trajectory (see roi_crop.py)
+        window = None
+        if roi:
+            video_id = os.path.splitext(os.path.basename(video_path))[0]
+            window = crop_window(video_id, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
         frames = []
         while len(frames) < num_frames:
             ret, frame = cap.read()
             if not ret:
                 break
+            frame = crop(frame, window)
             frame = cv2.resize(frame, (112, 112))  # Resize to match the model's expected input size
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             frames.append(frame)
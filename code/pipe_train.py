@@ -2,10 +2,15 @@ import time
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
 from torch.utils.tensorboard import SummaryWriter
 from pipe_models import BinaryClassifier, AQAResNet18, C3DAQA
 from dataloader_pipe import VideoDataset
+from batch_transform import BatchTransform
+from loader_factory import make_loader
+from prefetcher import BatchPrefetcher
+from execution_mode import memory_format, prepare_model, autocast, float_outputs
+from clip_cache import ClipCache
+from label_table import LabelTable
 import numpy as np
 from scipy.stats import spearmanr
 from sklearn.metrics import roc_auc_score
@@ -17,12 +22,13 @@ def evaluate_scorer(scorer, data_loader, device):
     true_scores = []
     with torch.no_grad():
         for batch_data in data_loader:
-            frames = batch_data[0].type(torch.FloatTensor).to(device)
-            frames = frames.permute(0, 4, 1, 2, 3)
-            score_labels = batch_data[1].type(torch.FloatTensor).to(device)
+            frames = batch_data[0]
+            score_labels = batch_data[1]
 
 
-            output = scorer(frames)
+            with autocast(device):
+                output = scorer(frames)
+            output = float_outputs(output)
 
             predicted_scores.extend(output.to(device).numpy())
             true_scores.extend(score_labels.to(device).numpy())
@@ -42,11 +48,12 @@ def auc_classifier(classifier, test_data, device):
 
     with torch.no_grad():
         for data in test_data:
-            frames = data[0].type(torch.FloatTensor).to(device)
-            frames = frames.permute(0, 4, 1, 2, 3)
-            classification_labels = data[1].type(torch.FloatTensor).to(device)
+            frames = data[0]
+            classification_labels = data[1]
 
-            output = classifier(frames)
+            with autocast(device):
+                output = classifier(frames)
+            output = float_outputs(output)
 
             true_labels.extend(classification_labels.to(device).numpy())
             predicted_probs.extend(output.to(device).numpy())
@@ -73,6 +80,21 @@ def print_metrics(epoch, loss, type, epoch_end, acc=0.0):
     )
 
 
+def print_cache_stats(data_loader):
+    cache = getattr(data_loader.dataset, "cache", None)
+    if cache is None:
+        return
+
+    stats = cache.stats()
+    print(
+        f"clip cache hits: {stats['hits']}, "
+        f"misses: {stats['misses']}, "
+        f"hit rate: {stats['hit_rate']:.3f}, "
+        f"evictions: {stats['evictions']}, "
+        f"cached clips: {stats['cached_clips']}/{stats['slots']}"
+    )
+
+
 def log_metrics(epoch, loss, data_load_time, step_time, summary_writer, step):
     summary_writer.add_scalar("epoch", epoch, step)
     summary_writer.add_scalars(
@@ -89,24 +111,25 @@ def log_metrics(epoch, loss, data_load_time, step_time, summary_writer, step):
 
 def train_classifier(num_epochs, classifier, class_train_data_loader, optimizer, eval_freq, class_test_data_loader, print_frequency, device,
                       log_frequency, criterion_classification, summary_writer, step):
+
     for epoch in range(num_epochs):
         epoch_start_time = time.time()
         print('-------------------------------------------------------------------------------------------------------')
-        data_load_start_time = time.time()
         classification_running_loss = 0.0
         classifier.train()
 
         for _, batch_data in enumerate(class_train_data_loader):
-            frames = batch_data[0].type(torch.FloatTensor).to(device)
-            frames = frames.permute(0, 4, 1, 2, 3)
+            frames = batch_data[0]
             
-            classification_labels = batch_data[1].type(torch.FloatTensor).to(device)
+            classification_labels = batch_data[1]
 
             data_load_end_time = time.time()
 
             optimizer.zero_grad()
 
-            output_class = classifier(frames)
+            with autocast(device):
+                output_class = classifier(frames)
+            output_class = float_outputs(output_class)
 
             classification_loss = criterion_classification(output_class, classification_labels.float().view(-1, 1))
 
@@ -118,7 +141,7 @@ def train_classifier(num_epochs, classifier, class_train_data_loader, optimizer,
 
             classification_running_loss += classification_loss.item()
 
-            data_load_time = data_load_end_time - data_load_start_time
+            data_load_time = class_train_data_loader.last_stall
             step_time = time.time() - data_load_end_time
 
             if ((step + 1) % log_frequency) == 0:
@@ -137,6 +160,8 @@ def train_classifier(num_epochs, classifier, class_train_data_loader, optimizer,
         if ((epoch + 1) % print_frequency) == 0:
             print_metrics(epoch=epoch+1, loss=avg_classification_loss, type="classification ", epoch_end=epoch_time, acc=auc_class)
             print(f"running loss classifier: {classification_running_loss:.3f}")
+            print(f"input stall: {class_train_data_loader.stall_time:.3f}s of {epoch_time:.3f}s epoch")
+            print_cache_stats(class_train_data_loader)
 
         #if (epoch + 1) % 1 == 0:
         torch.save(classifier.state_dict(), 'classifier_model_r3d18.pth')
@@ -144,26 +169,26 @@ def train_classifier(num_epochs, classifier, class_train_data_loader, optimizer,
 
 def train_aqa(num_epochs, scorer, train_data_loader, optimizer, eval_freq, test_data_loader, print_frequency, device,
                    log_frequency, criterion_scorer, criterion_scorer_penalty, summary_writer, step, model_type):
-    
+
     for epoch in range(num_epochs):
         epoch_start_time = time.time()
         print('-------------------------------------------------------------------------------------------------------')
-        data_load_start_time = time.time()
         scorer_running_loss = 0.0
         scorer.train()
 
         for _, batch_data in enumerate(train_data_loader):
-            frames = batch_data[0].type(torch.FloatTensor).to(device)
-            frames = frames.permute(0, 4, 1, 2, 3)
+            frames = batch_data[0]
             
-            score_labels = batch_data[1].type(torch.FloatTensor).to(device)
+            score_labels = batch_data[1]
             score_labels = score_labels.float().view(-1, 1)
 
             data_load_end_time = time.time()
 
             optimizer.zero_grad()
 
-            output_score = scorer(frames)
+            with autocast(device):
+                output_score = scorer(frames)
+            output_score = float_outputs(output_score)
 
             final_score_loss = criterion_scorer(output_score, score_labels.float()) + criterion_scorer_penalty(output_score, score_labels.float())
 
@@ -175,7 +200,7 @@ def train_aqa(num_epochs, scorer, train_data_loader, optimizer, eval_freq, test_
 
             scorer_running_loss += final_score_loss.item()
 
-            data_load_time = data_load_end_time - data_load_start_time
+            data_load_time = train_data_loader.last_stall
             step_time = time.time() - data_load_end_time
 
             if ((step + 1) % log_frequency) == 0:
@@ -196,6 +221,8 @@ def train_aqa(num_epochs, scorer, train_data_loader, optimizer, eval_freq, test_
             scorer_type = "spearman score for " + model_type + " "
             print_metrics(epoch=epoch+1, loss=avg_scorer_loss, type=scorer_type, epoch_end=epoch_time, acc=correlation_coeff)
             print(f"running loss avg scorer ohp: {avg_scorer_loss:.3f}")
+            print(f"input stall: {train_data_loader.stall_time:.3f}s of {epoch_time:.3f}s epoch")
+            print_cache_stats(train_data_loader)
 
         #if (epoch + 1) % 5 == 0:
         path_name = "scorer_" + model_type + "_.path"
@@ -213,53 +240,70 @@ def main():
     print_frequency = 1
     batch_size = 16
     eval_freq = 1
+    max_clip_cache_bytes = 8 * 1024 ** 3
+    to_input = BatchTransform(device, memory_format=memory_format())
 
     all_vids_path = "../../dissData/video_npy_reduced/allVids"
     c3d_pkl_path = "../../dissData/c3d.pickle"
 
+    #one label table for every task and split, see label_table.py
+    labels = LabelTable()
+
     #ohp aqa labels
-    ohp_aqa_train_labels = "../labels/ohp_aqa_labels/ohp_aqa_train.pkl"
-    video_dataset_ohp_train = VideoDataset(all_vids_path, ohp_aqa_train_labels, transform=None, num_frames=32)
+    ohp_aqa_train_labels = labels.view("ohp_aqa", "train")
+    video_dataset_ohp_train = VideoDataset(all_vids_path, ohp_aqa_train_labels, transform=None, num_frames=32, sampling="segment", jitter=True)
 
-    ohp_aqa_labels_valid = "../labels/ohp_aqa_labels/ohp_aqa_valid.pkl"
-    video_dataset_valid_ohp = VideoDataset(all_vids_path, ohp_aqa_labels_valid, transform=None, num_frames=32)
+    ohp_aqa_labels_valid = labels.view("ohp_aqa", "valid")
+    video_dataset_valid_ohp = VideoDataset(all_vids_path, ohp_aqa_labels_valid, transform=None, num_frames=32, sampling="segment")
 
-    labels_test_ohp = "../labels/ohp_aqa_labels/ohp_aqa_test.pkl"
-    video_dataset_test_ohp = VideoDataset(all_vids_path, labels_test_ohp, transform=None, num_frames=32)
+    labels_test_ohp = labels.view("ohp_aqa", "test")
+    video_dataset_test_ohp = VideoDataset(all_vids_path, labels_test_ohp, transform=None, num_frames=32, sampling="segment")
 
-    ohp_train_data_loader = DataLoader(video_dataset_ohp_train, batch_size=batch_size, shuffle=True)
-    ohp_validation_data = DataLoader(video_dataset_valid_ohp, batch_size)
-    ohp_test_data_loader = DataLoader(video_dataset_test_ohp, batch_size)
+    ohp_train_data_loader = BatchPrefetcher(make_loader(video_dataset_ohp_train, batch_size, shuffle=True), to_input)
+    ohp_validation_data = BatchPrefetcher(make_loader(video_dataset_valid_ohp, batch_size), to_input)
+    ohp_test_data_loader = BatchPrefetcher(make_loader(video_dataset_test_ohp, batch_size), to_input)
 
 
     #squats aqa labels
-    squats_aqa_train_labels = "../labels/squat_aqa_labels/squats_aqa_train.pkl"
-    video_dataset_squats_train = VideoDataset(all_vids_path, squats_aqa_train_labels, transform=None, num_frames=32)
+    squats_aqa_train_labels = labels.view("squat_aqa", "train")
+    video_dataset_squats_train = VideoDataset(all_vids_path, squats_aqa_train_labels, transform=None, num_frames=32, sampling="segment", jitter=True)
 
-    squats_aqa_labels_valid = "../labels/squat_aqa_labels/squats_aqa_valid.pkl"
-    video_dataset_valid_squats = VideoDataset(all_vids_path, squats_aqa_labels_valid, transform=None, num_frames=32)
+    squats_aqa_labels_valid = labels.view("squat_aqa", "valid")
+    video_dataset_valid_squats = VideoDataset(all_vids_path, squats_aqa_labels_valid, transform=None, num_frames=32, sampling="segment")
 
-    labels_test_squats = "../labels/squat_aqa_labels/squats_aqa_test.pkl"
-    video_dataset_test_squats = VideoDataset(all_vids_path, labels_test_squats, transform=None, num_frames=32)
+    labels_test_squats = labels.view("squat_aqa", "test")
+    video_dataset_test_squats = VideoDataset(all_vids_path, labels_test_squats, transform=None, num_frames=32, sampling="segment")
 
-    squat_train_data_loader = DataLoader(video_dataset_squats_train, batch_size=batch_size, shuffle=True)
-    squat_validation_data = DataLoader(video_dataset_valid_squats, batch_size)
-    squat_test_data_loader = DataLoader(video_dataset_test_squats, batch_size)
+    squat_train_data_loader = BatchPrefetcher(make_loader(video_dataset_squats_train, batch_size, shuffle=True), to_input)
+    squat_validation_data = BatchPrefetcher(make_loader(video_dataset_valid_squats, batch_size), to_input)
+    squat_test_data_loader = BatchPrefetcher(make_loader(video_dataset_test_squats, batch_size), to_input)
 
 
     #classification labels
-    class_train_labels = "../labels/classification_labels/class_labels_train.pkl"
-    video_dataset_class_train = VideoDataset(all_vids_path, class_train_labels, transform=None, num_frames=32)
+    class_train_labels = labels.view("classification", "train")
+    video_dataset_class_train = VideoDataset(all_vids_path, class_train_labels, transform=None, num_frames=32, sampling="segment", jitter=True)
 
-    class_labels_valid = "../labels/classification_labels/class_labels_valid.pkl"
-    video_dataset_valid_class = VideoDataset(all_vids_path, class_labels_valid, transform=None, num_frames=32)
+    class_labels_valid = labels.view("classification", "valid")
+    video_dataset_valid_class = VideoDataset(all_vids_path, class_labels_valid, transform=None, num_frames=32, sampling="segment")
 
-    labels_test_class = "../labels/classification_labels/class_labels_test.pkl"
-    video_dataset_test_class = VideoDataset(all_vids_path, labels_test_class, transform=None, num_frames=32)
+    labels_test_class = labels.view("classification", "test")
+    video_dataset_test_class = VideoDataset(all_vids_path, labels_test_class, transform=None, num_frames=32, sampling="segment")
 
-    class_train_data_loader = DataLoader(video_dataset_class_train, batch_size=batch_size, shuffle=True)
-    class_validation_data = DataLoader(video_dataset_valid_class, batch_size)
-    class_test_data_loader = DataLoader(video_dataset_test_class, batch_size)
+    class_train_data_loader = BatchPrefetcher(make_loader(video_dataset_class_train, batch_size, shuffle=True), to_input)
+    class_validation_data = BatchPrefetcher(make_loader(video_dataset_valid_class, batch_size), to_input)
+    class_test_data_loader = BatchPrefetcher(make_loader(video_dataset_test_class, batch_size), to_input)
+
+
+    #every dataset reads from allVids, so they share one clip cache across models and epochs
+    datasets = [video_dataset_ohp_train, video_dataset_valid_ohp, video_dataset_test_ohp,
+                video_dataset_squats_train, video_dataset_valid_squats, video_dataset_test_squats,
+                video_dataset_class_train, video_dataset_valid_class, video_dataset_test_class]
+    all_video_ids = sorted(set(video_id for dataset in datasets for video_id in dataset.video_ids))
+    clip_bytes = max(dataset.max_clip_bytes() for dataset in datasets)
+    # sized to hold every clip, up to max_clip_cache_bytes of shared memory
+    clip_cache = ClipCache(min(max_clip_cache_bytes, len(all_video_ids) * clip_bytes), clip_bytes, all_video_ids)
+    for dataset in datasets:
+        dataset.cache = clip_cache
 
 
     classifier = BinaryClassifier()
@@ -286,6 +330,12 @@ def main():
     over_head_press_AQA_resNet18.to(device)
     barbell_squat_AQA_resNet18.to(device)
 
+    classifier = prepare_model(classifier)
+    over_head_press_AQA_resNet18 = prepare_model(over_head_press_AQA_resNet18)
+    barbell_squat_AQA_resNet18 = prepare_model(barbell_squat_AQA_resNet18)
+    over_head_press_AQA_C3D = prepare_model(over_head_press_AQA_C3D)
+    barbell_squat_AQA_C3D = prepare_model(barbell_squat_AQA_C3D)
+
 
     criterion_classification = nn.BCELoss()
     criterion_scorer = nn.MSELoss()
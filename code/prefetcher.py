@@ -0,0 +1,97 @@
+import time
+import queue
+import threading
+import contextlib
+import torch
+
+# wraps a DataLoader so the next `depth` batches are already on the device, in model layout,
+# while the current step runs. stall_time is how long the training loop sat waiting on an
+# empty queue this epoch; if it is a large part of the epoch, training is input bound
+
+END = object()
+
+
+class BatchPrefetcher:
+    def __init__(self, loader, to_input, depth=2):
+        self.loader = loader
+        self.to_input = to_input
+        self.device = to_input.device
+        self.depth = depth
+
+        self.stall_time = 0.0
+        self.last_stall = 0.0
+
+    def __len__(self):
+        return len(self.loader)
+
+    @property
+    def dataset(self):
+        return self.loader.dataset
+
+    def convert(self, batch):
+        frames = self.to_input(batch[0])
+        labels = tuple(t.to(self.device, non_blocking=True).float() for t in batch[1:])
+        return (frames,) + labels
+
+    def produce(self, batches, stop):
+        use_stream = self.device.type == "cuda"
+        stream = torch.cuda.Stream(self.device) if use_stream else None
+
+        try:
+            for batch in self.loader:
+                with torch.cuda.stream(stream) if use_stream else contextlib.nullcontext():
+                    batch = self.convert(batch)
+                    event = torch.cuda.Event() if use_stream else None
+                    if use_stream:
+                        event.record(stream)
+
+                if not self.put(batches, stop, (batch, event)):
+                    return
+        except Exception as e:
+            self.put(batches, stop, e)
+            return
+
+        self.put(batches, stop, END)
+
+    def put(self, batches, stop, item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self.depth)
+        stop = threading.Event()
+        producer = threading.Thread(target=self.produce, args=(batches, stop), daemon=True)
+
+        self.stall_time = 0.0
+        self.last_stall = 0.0
+        producer.start()
+
+        try:
+            while True:
+                wait_start = time.time()
+                item = batches.get()
+                self.last_stall = time.time() - wait_start
+                self.stall_time += self.last_stall
+
+                if item is END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+
+                batch, event = item
+                if event is not None:
+                    current = torch.cuda.current_stream(self.device)
+                    current.wait_event(event)
+                    for t in batch:
+                        t.record_stream(current)
+
+                yield batch
+        finally:
+            # also reached when the training loop breaks out early
+            stop.set()
+            producer.join()
@@ -0,0 +1,108 @@
+import os
+import time
+import cv2
+import numpy as np
+from multiprocessing import Pool
+from clip_store import ClipStoreWriter
+from temporal_sampler import TemporalSampler
+from video_decode import open_video, iter_frames
+from label_table import LabelTable
+
+# decodes every video once and writes all the input variants the trainers use from that one
+# decode, each into its own clip store <store_dir>/<frames>x<height>x<width>. every kept frame
+# is resized from the full size image, so the variants match what the per-variant converters
+# produce. stores are appended to, so adding a variant (or videos) only decodes what is missing
+
+# (frames, height, width)
+VARIANTS = [
+    (16, 256, 256),  # trainer.py, c3d_classifier.py
+    (32, 128, 128),  # less_size_trainer_128.py, resNet_less_32_128.py
+    (32, 112, 112),  # pipe_showcase.py
+    (128, 64, 64),   # helpers/pkl_convert.py
+]
+FLUSH_EVERY = 100
+
+
+def variant_name(variant):
+    return "x".join(str(d) for d in variant)
+
+
+def decode_variants(job):
+    video_id, video_path, variants, sampling = job
+
+    cap, length = open_video(video_path)
+    if cap is None:
+        return video_id, variants, None, 0
+
+    plans = [TemporalSampler(num_frames, sampling).base_indices(length)[0] for num_frames, _, _ in variants]
+    clips = [np.zeros((num_frames, height, width, 3), dtype=np.uint8) for num_frames, height, width in variants]
+
+    # the union of every variant's frames, decoded in one pass
+    wanted = np.unique(np.concatenate([plan[plan >= 0] for plan in plans] + [np.zeros(0, dtype=np.int64)]))
+
+    decoded = 0
+    try:
+        for i, image in iter_frames(cap, wanted):
+            decoded += 1
+            for (_, height, width), plan, clip in zip(variants, plans, clips):
+                slots = np.flatnonzero(plan == wanted[i])
+                if len(slots):
+                    clip[slots] = cv2.resize(image, (width, height))
+    finally:
+        cap.release()
+
+    return video_id, variants, clips, decoded
+
+
+def init_worker():
+    cv2.setNumThreads(1)
+
+
+def preprocess(video_dir, video_ids, store_dir, variants=VARIANTS, sampling="head", processes=None):
+    writers = {variant: ClipStoreWriter(os.path.join(store_dir, variant_name(variant))) for variant in variants}
+
+    jobs = []
+    for video_id in video_ids:
+        missing = [variant for variant in variants if video_id not in writers[variant]]
+        if missing:
+            jobs.append((video_id, os.path.join(video_dir, f"{video_id}.mp4"), missing, sampling))
+
+    print(f"{len(video_ids) - len(jobs)} videos already have every variant, decoding {len(jobs)}")
+
+    start = time.time()
+    done, frames, failed = 0, 0, []
+    try:
+        with Pool(processes, initializer=init_worker) as pool:
+            for video_id, missing, clips, decoded in pool.imap_unordered(decode_variants, jobs):
+                if clips is None or decoded == 0:
+                    failed.append(video_id)
+                    continue
+
+                for variant, clip in zip(missing, clips):
+                    writers[variant].add(video_id, clip)
+
+                done += 1
+                frames += decoded
+                if done % FLUSH_EVERY == 0:
+                    for writer in writers.values():
+                        writer.flush()
+                    elapsed = time.time() - start
+                    print(f"{done}/{len(jobs)} videos, {done / elapsed:.2f} videos/s, {frames / elapsed:.1f} frames/s")
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    elapsed = max(time.time() - start, 1e-9)
+    print(f"{done} videos decoded once for their missing variants in {elapsed:.1f}s, {frames / elapsed:.1f} frames/s")
+    if failed:
+        print(f"{len(failed)} videos could not be decoded: {failed}")
+
+
+def main():
+    all_vids = "../../dissData/allVids"
+    store_dir = "../../dissData/clip_store/variants"
+
+    preprocess(all_vids, LabelTable().ids.tolist(), store_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import warnings
+import numpy as np
+from trajectory_table import TRAJECTORY_DIRS, load_tables, parse_file
+
+# one crop window per video worked out from the bar trajectories, so frames can be cropped
+# to the lifter before they are resized instead of shrinking the whole (mostly background) frame.
+#   OHP    per frame [bar boxes, lifter boxes, other boxes], box = [x1, y1, x2, y2, confidence]
+#   squat  per frame only the y centre of the bar box
+# both are in the 416x416 detector input, so they are scaled to the real frame size.
+# the per frame union box is median filtered over time and the window covers the 5th..95th
+# percentile of it plus a margin, so a few bad detections do not move or blow up the crop.
+# videos without a trajectory get no window (the whole frame is used)
+
+DETECTOR_SIZE = 416
+MIN_CONFIDENCE = 30
+SMOOTH_FRAMES = 9
+MARGIN = 0.1
+NUM_SLOTS = 3
+LIFTER_SLOT = 1
+
+tables = None
+
+
+def load_trajectory(video_id):
+    # (frame_count, box rows (frame, slot, xyxy, conf) or None, bar y centres or None).
+    # read from the trajectory_table.py tables, or from the json when no table was built
+    global tables
+    if tables is None:
+        tables = load_tables()
+
+    for table in tables:
+        if video_id in table:
+            centers = table.centers(video_id)
+            if len(centers):
+                return table.num_frames(video_id), None, centers
+            return table.num_frames(video_id), table.boxes(video_id), None
+
+    for trajectory_dir in TRAJECTORY_DIRS:
+        path = os.path.join(trajectory_dir, f"{video_id}.json")
+        if os.path.exists(path):
+            num_frames, rows, centers = parse_file(path)
+            if rows is None:
+                return num_frames, None, centers
+            return num_frames, (rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), rows[:, 2:6], rows[:, 6]), None
+
+    return 0, None, None
+
+
+def best_boxes(num_frames, frame, xyxy, conf):
+    # (frames, 4) most confident box per frame, nan where none reaches MIN_CONFIDENCE
+    out = np.full((num_frames, 4), np.nan)
+    keep = conf >= MIN_CONFIDENCE
+    frame, xyxy, conf = frame[keep], xyxy[keep], conf[keep]
+
+    # by frame, most confident first (stable, so ties keep file order like max() did)
+    order = np.lexsort((-conf.astype(np.float64), frame))
+    frame, xyxy = frame[order], xyxy[order]
+    first = np.r_[True, frame[1:] != frame[:-1]] if len(frame) else np.zeros(0, dtype=bool)
+    out[frame[first]] = xyxy[first]
+    return out
+
+
+def frame_boxes(num_frames, frame, slot, xyxy, conf):
+    # (frames, 4) box per frame, nan where nothing was found. the bar box spans the plates, so
+    # it only widens the window vertically; left and right come from the lifter box
+    per_slot = np.stack([best_boxes(num_frames, frame[slot == s], xyxy[slot == s], conf[slot == s])
+                         for s in range(NUM_SLOTS)])
+
+    # fmin / fmax skip nan, so slots without a box do not blank the frame
+    union = np.stack([np.fmin.reduce(per_slot[..., 0]), np.fmin.reduce(per_slot[..., 1]),
+                      np.fmax.reduce(per_slot[..., 2]), np.fmax.reduce(per_slot[..., 3])], axis=1)
+
+    lifter = per_slot[LIFTER_SLOT]
+    has_lifter = ~np.isnan(lifter[:, 0])
+    union[has_lifter, 0] = lifter[has_lifter, 0]
+    union[has_lifter, 2] = lifter[has_lifter, 2]
+    return union
+
+
+def smooth(values):
+    # running median over SMOOTH_FRAMES frames, per column, ignoring missing frames
+    pad = SMOOTH_FRAMES // 2
+    padded = np.pad(values, ((pad, pad), (0, 0)), mode='edge')
+    windows = np.lib.stride_tricks.sliding_window_view(padded, SMOOTH_FRAMES, axis=0)
+    with warnings.catch_warnings():
+        # all-nan windows (no detection nearby) stay nan
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmedian(windows, axis=-1)
+
+
+def crop_window(video_id, width, height, margin=MARGIN):
+    # (x1, y1, x2, y2) in pixels of a width x height frame, or None
+    num_frames, rows, centers = load_trajectory(video_id)
+    if num_frames == 0:
+        return None
+
+    if rows is not None:
+        boxes = smooth(frame_boxes(num_frames, *rows))
+    else:
+        # squat files only have the bar height: keep every column, from above the bar down
+        centers = smooth(np.asarray(centers, dtype=np.float64)[:, None])[:, 0]
+        boxes = np.stack([np.zeros_like(centers), centers, np.full_like(centers, DETECTOR_SIZE),
+                          np.full_like(centers, DETECTOR_SIZE)], axis=1)
+
+    boxes = boxes[~np.isnan(boxes).any(axis=1)]
+    if len(boxes) == 0:
+        return None
+
+    x1, y1 = np.percentile(boxes[:, 0], 5), np.percentile(boxes[:, 1], 5)
+    x2, y2 = np.percentile(boxes[:, 2], 95), np.percentile(boxes[:, 3], 95)
+
+    pad_x, pad_y = (x2 - x1) * margin, (y2 - y1) * margin
+    scale_x, scale_y = width / DETECTOR_SIZE, height / DETECTOR_SIZE
+
+    x1 = int(max((x1 - pad_x) * scale_x, 0))
+    y1 = int(max((y1 - pad_y) * scale_y, 0))
+    x2 = int(min((x2 + pad_x) * scale_x, width))
+    y2 = int(min((y2 + pad_y) * scale_y, height))
+
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return x1, y1, x2, y2
+
+
+def crop(frame, window):
+    if window is None:
+        return frame
+    x1, y1, x2, y2 = window
+    return frame[y1:y2, x1:x2]
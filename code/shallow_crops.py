@@ -0,0 +1,124 @@
+import os
+import json
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from clip_store import ClipStore, ClipStoreWriter
+from atomic_file import atomic_json
+
+# the shallow squat crops (<video>_<frame>.jpg, 299x299) packed into one raw clip store, one clip
+# per video with its frames in frame order, so a video's stack is a single memmap slice.
+# <path>.shallow.json sits next to it with, per video, the frame numbers, the per frame
+# shallow depth label (-1 where the frame has none) and the split from splits/*_ids.json
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SHALLOW_DIR = os.path.join(DATA_DIR, "Squat", "Labeled_Dataset", "Shallow_Squat_Error_Dataset")
+CROPS_DIR = os.path.join(SHALLOW_DIR, "crops_unaligned")
+LABELS_FILE = os.path.join(SHALLOW_DIR, "labels_shallow_depth.json")
+SPLIT_FILES = {
+    "train": os.path.join(SHALLOW_DIR, "splits", "train_ids.json"),
+    "valid": os.path.join(SHALLOW_DIR, "splits", "val_ids.json"),
+    "test": os.path.join(SHALLOW_DIR, "splits", "test_ids.json"),
+}
+ARCHIVE = "../../dissData/clip_store/shallow_crops"
+DECODE_THREADS = 8
+
+
+def meta_path(path):
+    return path + ".shallow.json"
+
+
+def split_frame_id(frame_id):
+    video_id, frame = frame_id.rsplit("_", 1)
+    return video_id, int(frame)
+
+
+def read_crop(path):
+    crop = cv2.imread(path, cv2.IMREAD_COLOR)
+    if crop is None:
+        raise ValueError(f"cannot read {path}")
+    return crop
+
+
+def read_video(crops_dir, video_id, frames):
+    paths = [os.path.join(crops_dir, f"{video_id}_{frame}.jpg") for frame in frames]
+    first = read_crop(paths[0])
+    stack = np.empty((len(frames),) + first.shape, dtype=np.uint8)
+    stack[0] = first
+    for i, path in enumerate(paths[1:], 1):
+        stack[i] = read_crop(path)
+    return stack
+
+
+def pack_crops(crops_dir=CROPS_DIR, out_path=ARCHIVE, labels_file=LABELS_FILE, split_files=SPLIT_FILES):
+    frames_of = {}
+    for file in os.listdir(crops_dir):
+        if file.endswith(".jpg"):
+            video_id, frame = split_frame_id(os.path.splitext(file)[0])
+            frames_of.setdefault(video_id, []).append(frame)
+    video_ids = sorted(frames_of)
+    for video_id in video_ids:
+        frames_of[video_id].sort()
+
+    with open(labels_file, 'r') as f:
+        labels = json.load(f)
+
+    split_of = {}
+    for split, path in split_files.items():
+        with open(path, 'r') as f:
+            for frame_id in json.load(f):
+                split_of[split_frame_id(frame_id)[0]] = split
+
+    # jpeg decoding releases the GIL, so threads decode whole videos side by side while the
+    # main thread appends them to the store in order
+    if os.path.exists(out_path + ".index.json"):
+        os.remove(out_path + ".index.json")
+        os.remove(out_path + ".bin")
+
+    with ClipStoreWriter(out_path) as writer, ThreadPoolExecutor(DECODE_THREADS) as pool:
+        stacks = pool.map(lambda video_id: read_video(crops_dir, video_id, frames_of[video_id]), video_ids)
+        for video_id, stack in zip(video_ids, stacks):
+            writer.add(video_id, stack)
+
+    meta = {"videos": {}}
+    for video_id in video_ids:
+        meta["videos"][video_id] = {
+            "frames": frames_of[video_id],
+            "labels": [labels.get(f"{video_id}_{frame}", -1) for frame in frames_of[video_id]],
+            "split": split_of.get(video_id),
+        }
+
+    atomic_json(meta_path(out_path), meta)
+
+    num_frames = sum(len(frames) for frames in frames_of.values())
+    print(f"packed {num_frames} crops of {len(video_ids)} videos into {out_path}.bin")
+
+
+class ShallowCrops:
+    def __init__(self, path=ARCHIVE):
+        self.store = ClipStore(path)
+        with open(meta_path(path), 'r') as f:
+            self.videos = json.load(f)["videos"]
+
+        # (video id, frame number) -> row of that frame inside the video's stack
+        self.row_of = {(video_id, frame): row for video_id, video in self.videos.items()
+                       for row, frame in enumerate(video["frames"])}
+
+    def video_ids(self, split=None):
+        return [video_id for video_id, video in self.videos.items() if split is None or video["split"] == split]
+
+    def stack(self, video_id):
+        return self.store.get(video_id)
+
+    def labels(self, video_id):
+        return np.array(self.videos[video_id]["labels"], dtype=np.float32)
+
+    def frame(self, video_id, frame):
+        return self.store.get(video_id)[self.row_of[(video_id, frame)]]
+
+
+def main():
+    pack_crops()
+
+if __name__ == "__main__":
+    main()
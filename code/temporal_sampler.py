@@ -0,0 +1,139 @@
+import numpy as np
+
+# picks which frames of a clip make up a sample.
+#   head           first num_frames frames, zero padded (what the datasets always did)
+#   uniform        num_frames frames spread evenly over the whole clip
+#   segment        clip cut into num_frames equal segments, one frame per segment
+#                  (random inside the segment when jitter is on, the middle otherwise)
+#   random_offset  num_frames consecutive frames (every `stride`-th one) starting at a
+#                  random offset when jitter is on, centred otherwise
+#   topk           the num_frames frames with the most motion energy (motion_energy.py), in order
+#   active         segment sampling inside the span where the motion energy is above
+#                  ACTIVE_FRACTION of its peak, which cuts set-up and idle frames
+# the energy policies need a per-video signal passed to build(); videos without one fall back
+# to uniform. the per-video base indices are worked out once; a sample is then one gather.
+
+POLICIES = ("head", "uniform", "segment", "random_offset", "topk", "active")
+ENERGY_POLICIES = ("topk", "active")
+ACTIVE_FRACTION = 0.25
+ACTIVE_SMOOTH = 5
+
+
+def active_span(energy, min_length):
+    # [start, end) around every frame whose smoothed energy reaches ACTIVE_FRACTION of the peak
+    smoothed = np.convolve(energy, np.ones(ACTIVE_SMOOTH) / ACTIVE_SMOOTH, mode='same')
+    active = np.flatnonzero(smoothed >= ACTIVE_FRACTION * smoothed.max()) if smoothed.max() > 0 else []
+    if len(active) == 0:
+        return 0, len(energy)
+
+    start, end = int(active[0]), int(active[-1]) + 1
+    if end - start < min_length:
+        # grown to min_length around its centre, within the clip
+        start = max(min(start - (min_length - (end - start)) // 2, len(energy) - min_length), 0)
+        end = min(start + min_length, len(energy))
+    return start, end
+
+
+class TemporalSampler:
+    def __init__(self, num_frames, policy="head", jitter=False, stride=1):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown sampling policy {policy}, expected one of {POLICIES}")
+
+        self.num_frames = num_frames
+        self.policy = policy
+        self.jitter = jitter
+        self.stride = stride
+
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.table = np.zeros((0, num_frames), dtype=np.int64)
+        self.spread = np.zeros(0, dtype=np.int64)
+        self.last = np.zeros(0, dtype=np.int64)
+        self.energies = []
+
+    def build(self, lengths, energies=None):
+        # lengths[i] is the frame count of video i, or -1 if it is only known once the clip is loaded.
+        # energies[i] is video i's motion energy signal (or None) for the energy policies
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.table = np.full((len(self.lengths), self.num_frames), -1, dtype=np.int64)
+        self.spread = np.zeros(len(self.lengths), dtype=np.int64)
+        self.last = np.zeros(len(self.lengths), dtype=np.int64)
+        self.energies = list(energies) if energies is not None else [None] * len(self.lengths)
+
+        for idx, length in enumerate(self.lengths):
+            if length >= 0:
+                self.table[idx], self.spread[idx], self.last[idx] = self.base_indices(length, self.energies[idx])
+
+    def base_indices(self, length, energy=None):
+        # (base indices, jitter spread, last frame the jitter may reach)
+        n = self.num_frames
+        steps = np.arange(n, dtype=np.int64)
+
+        if length <= 0:
+            return np.full(n, -1, dtype=np.int64), 0, -1
+
+        policy = self.policy
+        if policy in ENERGY_POLICIES:
+            if energy is None or len(energy) == 0:
+                policy = "uniform"
+            else:
+                # the signal may come from a longer source than the clip it indexes
+                energy = np.asarray(energy[:length], dtype=np.float64)
+                length = len(energy)
+
+        if policy == "head":
+            return np.where(steps < length, steps, -1), 0, length - 1
+
+        if policy == "uniform":
+            return steps * length // n, 0, length - 1
+
+        if policy == "topk":
+            if length <= n:
+                return np.where(steps < length, steps, -1), 0, length - 1
+            # stable sort, so equal energies keep the earlier frame
+            return np.sort(np.argsort(-energy, kind="stable")[:n]), 0, length - 1
+
+        if policy in ("segment", "active"):
+            start, end = active_span(energy, n) if policy == "active" else (0, length)
+            span = end - start
+            starts = start + steps * span // n
+            seg_len = max(span // n, 1)
+            if self.jitter:
+                return starts, seg_len, end - 1
+            return np.minimum(starts + seg_len // 2, end - 1), 0, end - 1
+
+        span = (n - 1) * self.stride + 1
+        offsets = steps * self.stride
+        if span > length:
+            return np.where(offsets < length, offsets, -1), 0, length - 1
+        if self.jitter:
+            return offsets, length - span + 1, length - 1
+        return offsets + (length - span) // 2, 0, length - 1
+
+    def indices(self, idx, length=None):
+        if self.table[idx, 0] < 0 and length is not None:
+            self.lengths[idx] = length
+            self.table[idx], self.spread[idx], self.last[idx] = self.base_indices(length, self.energies[idx])
+
+        indices = self.table[idx]
+        spread = self.spread[idx]
+
+        if spread > 1:
+            if self.policy in ("segment", "active"):
+                # kept inside the segmented span, which for active is not the whole clip
+                indices = np.minimum(indices + np.random.randint(0, spread, self.num_frames), self.last[idx])
+            else:
+                indices = indices + np.random.randint(0, spread)
+
+        return indices
+
+    def sample(self, idx, clip):
+        indices = self.indices(idx, len(clip))
+
+        out = np.empty((self.num_frames,) + clip.shape[1:], dtype=clip.dtype)
+
+        # padding (-1) only ever shows up at the tail
+        valid = int(np.count_nonzero(indices >= 0))
+        np.take(clip, indices[:valid], axis=0, out=out[:valid])
+        out[valid:] = 0
+
+        return out
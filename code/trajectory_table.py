@@ -0,0 +1,107 @@
+import os
+import json
+import numpy as np
+from multiprocessing import Pool
+from atomic_file import atomic_write
+
+# a whole bar_trajectories_raw directory as one .npz of flat columns instead of thousands of
+# nested json files:
+#   ids            video ids
+#   frame_counts   frames per video (frames with no detection included)
+#   box_offsets    video i owns box rows box_offsets[i]:box_offsets[i + 1]
+#   box_frame, box_slot, box_xyxy (N, 4), box_conf      one row per detected box (OHP files)
+#   center_offsets / center_y                           one row per frame (squat files, bar y only)
+# TrajectoryTable hands out slices of these columns, so reading a video costs no python loop
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TRAJECTORY_DIRS = [
+    os.path.join(DATA_DIR, "OHP", "Unlabeled_Dataset", "bar_trajectories_raw"),
+    os.path.join(DATA_DIR, "Squat", "Unlabeled_Dataset", "bar_trajectories_raw"),
+]
+TABLE_NAME = "bar_trajectories.npz"
+
+
+def table_path(trajectory_dir):
+    return os.path.join(os.path.dirname(os.path.normpath(trajectory_dir)), TABLE_NAME)
+
+
+def parse_file(path):
+    with open(path, 'r') as f:
+        trajectory = json.load(f)
+
+    if trajectory and not isinstance(trajectory[0], list):
+        return len(trajectory), None, np.array(trajectory, dtype=np.float32)
+
+    rows = [(frame, slot, *box) for frame, slots in enumerate(trajectory)
+            for slot, boxes in enumerate(slots) for box in boxes]
+    return len(trajectory), np.array(rows, dtype=np.float32).reshape(-1, 7), None
+
+
+def convert_directory(trajectory_dir, out_path=None, processes=None):
+    files = sorted(file for file in os.listdir(trajectory_dir) if file.endswith(".json"))
+    with Pool(processes) as pool:
+        parsed = pool.map(parse_file, [os.path.join(trajectory_dir, file) for file in files], chunksize=32)
+
+    frame_counts = np.array([count for count, _, _ in parsed], dtype=np.int32)
+    boxes = [rows if rows is not None else np.zeros((0, 7), dtype=np.float32) for _, rows, _ in parsed]
+    centers = [values if values is not None else np.zeros(0, dtype=np.float32) for _, _, values in parsed]
+    box_rows = np.concatenate(boxes)
+
+    columns = {
+        "ids": np.array([os.path.splitext(file)[0] for file in files]),
+        "frame_counts": frame_counts,
+        "box_offsets": np.concatenate([[0], np.cumsum([len(rows) for rows in boxes])]).astype(np.int64),
+        "box_frame": box_rows[:, 0].astype(np.int32),
+        "box_slot": box_rows[:, 1].astype(np.int8),
+        # detector boxes are whole pixels of the 416x416 input and confidences whole percents
+        "box_xyxy": box_rows[:, 2:6].astype(np.int16),
+        "box_conf": box_rows[:, 6].astype(np.uint8),
+        "center_offsets": np.concatenate([[0], np.cumsum([len(values) for values in centers])]).astype(np.int64),
+        "center_y": np.concatenate(centers).astype(np.float32),
+    }
+
+    out_path = out_path or table_path(trajectory_dir)
+    atomic_write(out_path, lambda f: np.savez(f, **columns))
+    print(f"{trajectory_dir}: {len(files)} videos, {len(box_rows)} boxes, {len(columns['center_y'])} centers -> {out_path}")
+
+
+class TrajectoryTable:
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.columns = {name: data[name] for name in data.files}
+        self.row_of = {video_id: row for row, video_id in enumerate(self.columns["ids"].tolist())}
+
+    def __contains__(self, video_id):
+        return video_id in self.row_of
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def num_frames(self, video_id):
+        return int(self.columns["frame_counts"][self.row_of[video_id]])
+
+    def boxes(self, video_id):
+        # (frame, slot, xyxy, conf) views for every box of the video
+        row = self.row_of[video_id]
+        start, end = self.columns["box_offsets"][row], self.columns["box_offsets"][row + 1]
+        return (self.columns["box_frame"][start:end], self.columns["box_slot"][start:end],
+                self.columns["box_xyxy"][start:end], self.columns["box_conf"][start:end])
+
+    def centers(self, video_id):
+        # bar y centre per frame (empty for videos stored as boxes)
+        row = self.row_of[video_id]
+        start, end = self.columns["center_offsets"][row], self.columns["center_offsets"][row + 1]
+        return self.columns["center_y"][start:end]
+
+
+def load_tables(trajectory_dirs=TRAJECTORY_DIRS):
+    return [TrajectoryTable(table_path(trajectory_dir)) for trajectory_dir in trajectory_dirs
+            if os.path.exists(table_path(trajectory_dir))]
+
+
+def main():
+    for trajectory_dir in TRAJECTORY_DIRS:
+        convert_directory(trajectory_dir)
+
+if __name__ == "__main__":
+    main()
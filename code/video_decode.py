@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+
+# decodes only the frames that were asked for. short gaps are skipped with grab(), which
+# demuxes without converting the picture, gaps longer than SEEK_GAP frames are jumped with a
+# seek, and decoding stops after the last wanted frame.
+# frames come back BGR like the .npy clips written by helpers/convert_npy.py
+
+SEEK_GAP = 64
+
+
+def open_video(video_path):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None, 0
+    return cap, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+
+def frame_size(cap):
+    return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+
+def read_frames(cap, indices, resize_shape=None):
+    return decode_plan(cap, indices, resize_shape)[0]
+
+
+def iter_frames(cap, indices):
+    # yields (position in indices, full size BGR image) for every wanted frame in order,
+    # stopping early if the video runs out. repeated indices yield the same image again
+    image = None
+    current = -1
+
+    for i, target in enumerate(indices):
+        if target < 0:
+            continue
+
+        if target != current:
+            if target - current > SEEK_GAP and cap.set(cv2.CAP_PROP_POS_FRAMES, int(target)):
+                current = target - 1
+
+            while current < target - 1:
+                if not cap.grab():
+                    return
+                current += 1
+
+            ret, image = cap.read()
+            if not ret:
+                return
+            current += 1
+
+        yield i, image
+
+
+def decode_plan(cap, indices, resize_shape=None, window=None):
+    # indices must be ascending (repeats allowed, -1 means padding); unread frames stay zero.
+    # also returns how many leading entries of indices were reached before the video ran out.
+    # window (x1, y1, x2, y2, see roi_crop.py) crops every frame before it is resized
+    out = None
+    frame = None
+    last_image = None
+    filled = 0
+
+    for i, image in iter_frames(cap, indices):
+        if image is not last_image:
+            last_image = image
+            if window is not None:
+                x1, y1, x2, y2 = window
+                image = image[y1:y2, x1:x2]
+            frame = cv2.resize(image, resize_shape) if resize_shape is not None else image
+
+        if out is None:
+            out = np.zeros((len(indices),) + frame.shape, dtype=np.uint8)
+        out[i] = frame
+        filled = i + 1
+
+    return finish(out, len(indices), resize_shape), filled
+
+
+def finish(out, num_frames, resize_shape):
+    if out is not None:
+        return out
+    # nothing could be decoded at all
+    width, height = resize_shape if resize_shape is not None else (0, 0)
+    return np.zeros((num_frames, height, width, 3), dtype=np.uint8)
+
+
+def decode_clip(video_path, indices, resize_shape=None):
+    cap, _ = open_video(video_path)
+    if cap is None:
+        return finish(None, len(indices), resize_shape)
+    try:
+        return read_frames(cap, indices, resize_shape)
+    finally:
+        cap.release()
@@ -0,0 +1,169 @@
+import os
+import json
+import struct
+import cv2
+from multiprocessing import Pool
+from atomic_file import atomic_json
+
+# reads duration, fps, frame count and resolution of an .mp4 straight from the container
+# boxes (moov/mvhd, trak/tkhd, mdia/mdhd, stbl/stsz) without decoding anything. only box
+# headers are read on the way to moov, so mdat is skipped over however big it is. files the
+# parser cannot handle fall back to asking opencv.
+# probe_directory keeps the results in <video_dir>/.probe_cache.json keyed by file name,
+# size and mtime, so re-runs only probe new or changed files
+
+PROBE_CACHE_NAME = ".probe_cache.json"
+CONTAINERS = (b"moov", b"trak", b"mdia", b"minf", b"stbl")
+
+
+def read_boxes(f, end):
+    # yields (type, payload start, payload end) for the boxes between f.tell() and end
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            return
+
+        yield box_type, start + header, start + size
+        f.seek(start + size)
+
+
+def full_box_times(f, start):
+    # mvhd / mdhd: version, then creation/modification times, timescale, duration
+    f.seek(start)
+    version = f.read(1)[0]
+    f.seek(start + 4)
+    if version == 1:
+        _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+    else:
+        _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+    return timescale, duration
+
+
+def parse_track(f, start, end, track):
+    for box_type, box_start, box_end in read_boxes(f, end):
+        if box_type in CONTAINERS:
+            parse_track(f, box_start, box_end, track)
+        elif box_type == b"tkhd":
+            f.seek(box_start)
+            version = f.read(1)[0]
+            # width and height are the last 8 bytes, 16.16 fixed point
+            f.seek(box_start + (84 if version == 1 else 72) + 4)
+            width, height = struct.unpack(">II", f.read(8))
+            track["width"], track["height"] = width >> 16, height >> 16
+        elif box_type == b"hdlr":
+            f.seek(box_start + 8)
+            track["handler"] = f.read(4)
+        elif box_type == b"mdhd":
+            track["timescale"], track["duration"] = full_box_times(f, box_start)
+        elif box_type == b"stsz":
+            f.seek(box_start + 8)
+            track["frames"] = struct.unpack(">I", f.read(4))[0]
+        f.seek(box_end)
+
+
+def probe_mp4(path):
+    file_size = os.path.getsize(path)
+    movie_duration = None
+    tracks = []
+
+    with open(path, 'rb') as f:
+        for box_type, start, end in read_boxes(f, file_size):
+            if box_type != b"moov":
+                continue
+            for inner_type, inner_start, inner_end in read_boxes(f, end):
+                if inner_type == b"mvhd":
+                    timescale, duration = full_box_times(f, inner_start)
+                    movie_duration = duration / timescale if timescale else None
+                elif inner_type == b"trak":
+                    track = {}
+                    parse_track(f, inner_start, inner_end, track)
+                    tracks.append(track)
+                f.seek(inner_end)
+            break
+
+    video = [track for track in tracks if track.get("handler") == b"vide"]
+    if movie_duration is None or not video or not video[0].get("timescale"):
+        raise ValueError(f"no moov/video track found in {path}")
+
+    track = video[0]
+    track_duration = track["duration"] / track["timescale"]
+    frames = track.get("frames", 0)
+
+    return {
+        "duration": movie_duration,
+        "fps": frames / track_duration if track_duration else 0.0,
+        "frames": frames,
+        "width": track.get("width", 0),
+        "height": track.get("height", 0),
+    }
+
+
+def probe_opencv(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"cannot open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    meta = {
+        "duration": frames / fps if fps else 0.0,
+        "fps": fps,
+        "frames": frames,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+    cap.release()
+    return meta
+
+
+def probe(path):
+    try:
+        return path, probe_mp4(path)
+    except (ValueError, struct.error, IndexError, OSError):
+        pass
+    try:
+        return path, probe_opencv(path)
+    except ValueError as e:
+        print(e)
+        return path, None
+
+
+def probe_directory(video_dir, processes=None):
+    cache_path = os.path.join(video_dir, PROBE_CACHE_NAME)
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+
+    files = {}
+    to_probe = []
+    for file in sorted(os.listdir(video_dir)):
+        if not file.endswith(".mp4"):
+            continue
+        path = os.path.join(video_dir, file)
+        stat = os.stat(path)
+        files[file] = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+        entry = cache.get(file)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            to_probe.append(path)
+
+    if to_probe:
+        with Pool(processes) as pool:
+            for path, meta in pool.imap_unordered(probe, to_probe, chunksize=16):
+                file = os.path.basename(path)
+                cache[file] = dict(files[file], meta=meta)
+
+    # files that are gone drop out of the cache
+    cache = {file: cache[file] for file in files}
+
+    atomic_json(cache_path, cache)
+
+    print(f"{video_dir}: {len(files)} videos, {len(to_probe)} probed, {len(files) - len(to_probe)} from cache")
+    return {os.path.splitext(file)[0]: entry["meta"] for file, entry in cache.items() if entry["meta"] is not None}